@@ -0,0 +1,102 @@
+'''
+
+    Times the install-prep phase of a spec 1 forge install (resolving every
+    processor's jar, classpath, main class and arguments) for growing profiles
+
+    python -m benchmarks.forge_install_prep [install_profile.json ...]
+
+    Without arguments synthetic profiles shaped like 1.20.1 are generated,
+    with arguments the given profiles are measured and their jars are
+    looked up in the real LIB_PATH
+
+'''
+
+import os
+import sys
+import json
+import time
+import zipfile
+import tempfile
+from hashlib import sha1
+from mod_manager import constants
+from mod_manager.downloaders.loaders import forge
+
+# (processors, libraries), a 1.20.1 profile has around 8 processors and 40 libraries
+SIZES = [(8, 40), (32, 160), (128, 640), (512, 2560)]
+CLASSPATH = 12
+
+def make_profile(processors : int, libraries : int) -> dict:
+    libs = []
+    for i in range(libraries):
+        path = f"net/minecraftforge/tool{i}/1.0/tool{i}-1.0.jar"
+        libs.append({"name": f"net.minecraftforge:tool{i}:1.0", "downloads": {"artifact": {"path": path, "url": "", "sha1": "0" * 40, "size": 1}}})
+
+    out_sha = sha1(b"out").hexdigest()
+    data = {"MOJMAPS": {"client": "[net.minecraft:client:1.20.1:mappings@txt]", "server": "''"}}
+    procs = []
+    for i in range(processors):
+        # processors use the tools at the end of the library list, like installertools
+        first = libraries - 1 - (i * CLASSPATH) % libraries
+        procs.append({
+            "jar": f"net.minecraftforge:tool{first}:1.0",
+            "classpath": [f"net.minecraftforge:tool{(first - j) % libraries}:1.0" for j in range(CLASSPATH)],
+            "args": ["--task", "MCP_DATA", "--input", "{MINECRAFT_JAR}", "--mappings", "{MOJMAPS}", "--output", f"{{OUT{i}}}"],
+            "outputs": {f"{{OUT{i}}}": f"{{OUT{i}_SHA}}"},
+        })
+        data[f"OUT{i}"] = {"client": f"[net.minecraft:client:1.20.1:out{i}]", "server": "''"}
+        data[f"OUT{i}_SHA"] = {"client": f"'{out_sha}'", "server": "''"}
+
+    return {"spec": 1, "version": "1.20.1-forge-47.1.0", "json": "/version.json", "minecraft": "1.20.1", "data": data, "processors": procs, "libraries": libs}
+
+def write_jars(profile : dict):
+    for lib in profile["libraries"]:
+        path = os.path.join(constants.LIB_PATH, lib["downloads"]["artifact"]["path"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with zipfile.ZipFile(path, "w") as jar:
+            jar.writestr("META-INF/MANIFEST.MF", f"Manifest-Version: 1.0\nMain-Class: {lib['name'].split(':')[1]}.Main\n")
+
+def measure(profile : dict, tempdir : str, iterations : int) -> tuple[float, float]:
+    '''
+
+    returns the seconds of the first (cold jar manifests) and of an average later plan
+
+    '''
+    forge.__main_classes.clear()
+    start = time.perf_counter()
+    forge.plan_processors(profile, tempdir)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        forge.plan_processors(profile, tempdir)
+    return cold, (time.perf_counter() - start) / iterations
+
+def __report(label : str, profile : dict, cold : float, warm : float):
+    classpath = sum(len(proc["classpath"]) for proc in profile["processors"])
+    print(f"{label:<32} {len(profile['processors']):6} {len(profile['libraries']):6} {classpath:8} {cold * 1000:10.2f} {warm * 1000:10.2f}")
+
+def main(paths : list[str]):
+    print(f"{'profile':<32} {'procs':>6} {'libs':>6} {'cp refs':>8} {'cold ms':>10} {'warm ms':>10}")
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                profile = json.load(f)
+            if profile.get("spec") != 1:
+                print(f"{path}: only spec 1 profiles have processors")
+                continue
+            cold, warm = measure(profile, tempdir, 20)
+            __report(os.path.basename(os.path.dirname(path)) or path, profile, cold, warm)
+
+        if paths:
+            return
+
+        constants.LIB_PATH = os.path.join(tempdir, "libraries")
+        for processors, libraries in SIZES:
+            profile = make_profile(processors, libraries)
+            write_jars(profile)
+            cold, warm = measure(profile, tempdir, 20)
+            __report(f"synthetic {processors}x{libraries}", profile, cold, warm)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
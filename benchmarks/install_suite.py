@@ -0,0 +1,134 @@
+'''
+
+    End to end install benchmarks against benchmarks/stub_server
+
+    python -m benchmarks.install_suite [--scale 1] [--latency 0.02] [--bandwidth 4M]
+                                      [--failure-rate 0.01] [--fixtures DIR] [--json results.json]
+
+    Every scenario runs in its own process with its own HOME, once cold and
+    once warm (everything already installed), so the numbers include
+    metadata, scheduling, hashing and disk work but never a real network
+
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCENARIOS = ["vanilla", "forge", "ftb", "curseforge"]
+
+def __parse_size(value : str) -> float:
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if value[-1].upper() in units:
+        return float(value[:-1]) * units[value[-1].upper()]
+    return float(value)
+
+def run_scenario(name : str, address : str):
+    '''
+
+    Child side, installs name through the stub server at address and
+    prints a RESULT line
+
+    '''
+    from benchmarks import stub_server
+    from mod_manager import events
+    from mod_manager.data_structures import MPVersion
+    from mod_manager.downloaders import vanilla, ftb, curseforge
+    from mod_manager.downloaders.loaders import forge
+
+    stub_server.redirect(address)
+    failed = []
+    events.subscribe(lambda event: failed.append(event.file) if event.type == events.EventType.FILE_FAILED else None)
+    directory = os.path.join(os.path.expanduser("~"), "instance", "minecraft")
+
+    start = time.perf_counter()
+    match name:
+        case "vanilla":
+            vanilla.download_from_manifest(stub_server.MC_VERSION)
+        case "forge":
+            forge.download(stub_server.FORGE_VERSION, stub_server.MC_VERSION)
+        case "ftb":
+            ftb.download(MPVersion("", stub_server.FTB_PACK, stub_server.PACK_VERSION), directory)
+        case "curseforge":
+            curseforge.download(MPVersion("", stub_server.CURSEFORGE_PACK, stub_server.PACK_VERSION), directory)
+    wall = time.perf_counter() - start
+
+    # ru_maxrss is KiB on linux and bytes on macOS
+    rss = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    print("RESULT " + json.dumps({"wall": wall, "peak_rss": rss, "failed_files": len(failed)}))
+
+def __run_child(name : str, address : str, home : str) -> dict:
+    env = dict(os.environ, HOME=home, APPDATA=home)
+    env.pop("MODMANAGER_OFFLINE", None)
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.install_suite", "--run", name, "--address", address],
+                               env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line.removeprefix("RESULT "))
+    raise RuntimeError(f"{name} failed:\n{completed.stderr[-4000:]}")
+
+def main(argv : list[str]):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.install_suite")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the number of assets, libraries and mods")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--bandwidth", type=__parse_size, default=None, help="bytes per second per connection, K / M / G suffixes")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests that fail or get cut off")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", default=None, help="recorded responses laid out as DIR/<host>/<path>")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", default=None, help="also write the results here")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--address", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        run_scenario(args.run, args.address)
+        return
+
+    from benchmarks import stub_server
+
+    catalog = stub_server.Catalog(args.scale, args.seed, args.fixtures)
+    server = stub_server.StubServer(catalog, args.latency, args.bandwidth, args.failure_rate, args.seed)
+    server.start()
+
+    results = []
+    print(f"{'scenario':<12} {'run':<5} {'wall s':>8} {'MiB':>8} {'MiB/s':>8} {'requests':>9} {'failures':>9} {'lost':>5} {'rss MiB':>8}")
+    try:
+        for name in args.scenarios.split(","):
+            home = tempfile.mkdtemp(prefix="modmanager-bench-")
+            try:
+                for run in ("cold", "warm"):
+                    server.stats.reset()
+                    child = __run_child(name, server.address, home)
+                    served = server.stats.to_dict()
+                    result = dict(served, scenario=name, run=run, wall=child["wall"], peak_rss=child["peak_rss"], failed_files=child["failed_files"],
+                                  throughput=served["bytes"] / child["wall"] if child["wall"] > 0 else 0.0)
+                    results.append(result)
+                    rss = f"{result['peak_rss'] / 1024 / 1024:8.1f}" if result["peak_rss"] else f"{'-':>8}"
+                    print(f"{name:<12} {run:<5} {result['wall']:8.2f} {result['bytes'] / 1024 / 1024:8.1f} "
+                          f"{result['throughput'] / 1024 / 1024:8.1f} {result['requests']:9} {result['failures']:9} {result['failed_files']:5} {rss}")
+            finally:
+                shutil.rmtree(home, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        options = {key: value for key, value in vars(args).items() if key not in ("run", "address", "json")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": options, "python": platform.python_version(), "platform": platform.platform(), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
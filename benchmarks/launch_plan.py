@@ -0,0 +1,102 @@
+'''
+
+    Compares cold launch preparation (walking the manifest chain) with a cached launch plan
+
+    python -m benchmarks.launch_plan [iterations]
+
+'''
+
+import os
+import sys
+import json
+import time
+import tempfile
+from mod_manager import constants
+from mod_manager.instances.instance import Instance
+
+def __library(i : int) -> dict:
+    path = f"org/example/lib{i}/1.0/lib{i}-1.0.jar"
+    lib = {
+        "name": f"org.example:lib{i}:1.0",
+        "downloads": {"artifact": {"path": path, "url": f"https://libraries.minecraft.net/{path}", "sha1": "0" * 40, "size": 1}},
+    }
+    if i % 10 == 0:
+        lib["rules"] = [{"action": "allow", "os": {"name": "osx"}}]
+    return lib
+
+def write_fixture(root : str, mc_version : str = "1.20.1", forge_version : str = "47.1.0", libraries : int = 120):
+    meta = os.path.join(root, "meta", "minecraft")
+    os.makedirs(meta, exist_ok=True)
+
+    vanilla = {
+        "id": mc_version,
+        "assets": "5",
+        "mainClass": "net.minecraft.client.main.Main",
+        "downloads": {"client": {"url": "", "sha1": "0" * 40, "size": 1}},
+        "libraries": [__library(i) for i in range(libraries)],
+        "arguments": {
+            "game": ["--username", "${auth_player_name}", "--version", "${version_name}", "--gameDir", "${game_directory}",
+                     "--assetsDir", "${assets_root}", "--assetIndex", "${assets_index_name}", "--uuid", "${auth_uuid}",
+                     "--accessToken", "${auth_access_token}", "--clientId", "${clientid}", "--xuid", "${auth_xuid}",
+                     "--userType", "${user_type}", "--versionType", "${version_type}",
+                     {"rules": [{"action": "allow", "features": {"is_demo_user": True}}], "value": "--demo"},
+                     {"rules": [{"action": "allow", "features": {"has_custom_resolution": True}}], "value": ["--width", "${resolution_width}", "--height", "${resolution_height}"]}],
+            "jvm": [{"rules": [{"action": "allow", "os": {"name": "osx"}}], "value": ["-XstartOnFirstThread"]},
+                    {"rules": [{"action": "allow", "os": {"name": "windows"}}], "value": "-XX:HeapDumpPath=MojangTricksIntelDriversForPerformance_javaw.exe_minecraft.exe.heapdump"},
+                    {"rules": [{"action": "allow", "os": {"name": "windows", "version": "^10\\."}}], "value": ["-Dos.name=Windows 10", "-Dos.version=10.0"]},
+                    {"rules": [{"action": "allow", "os": {"arch": "x86"}}], "value": "-Xss1M"},
+                    "-Djava.library.path=${natives_directory}", "-Dminecraft.launcher.brand=${launcher_name}",
+                    "-Dminecraft.launcher.version=${launcher_version}", "-cp", "${classpath}"],
+        },
+    }
+    forge = {
+        "id": f"{mc_version}-forge-{forge_version}",
+        "inheritsFrom": mc_version,
+        "mainClass": "cpw.mods.bootstraplauncher.BootstrapLauncher",
+        "libraries": [__library(1000 + i) for i in range(libraries // 2)],
+        "arguments": {"game": ["--launchTarget", "forgeclient"], "jvm": ["-DlibraryDirectory=${library_directory}"]},
+    }
+    for manifest in (vanilla, forge):
+        with open(os.path.join(meta, manifest["id"] + ".json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    for manifest in (vanilla, forge):
+        for lib in manifest["libraries"]:
+            path = os.path.join(root, "libraries", lib["downloads"]["artifact"]["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+def main(iterations : int = 200):
+    with tempfile.TemporaryDirectory() as root:
+        constants.META_PATH = os.path.join(root, "meta")
+        constants.LIB_PATH = os.path.join(root, "libraries")
+        write_fixture(root)
+
+        instance = Instance({
+            "name": "bench",
+            "mc_version": {"mc": "1.20.1", "loader": "forge", "loader_version": "47.1.0"},
+            "mp_version": {"name": "1", "mid": "1", "vid": "1"},
+            "platform": "custom",
+            "directory": os.path.join(root, "instance"),
+        })
+        plan_path = os.path.join(root, "instance", "launch_plan.json")
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            if os.path.exists(plan_path):
+                os.remove(plan_path)
+            instance.prepare_launch()
+        cold = (time.perf_counter() - start) / iterations
+
+        instance.prepare_launch()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            instance.prepare_launch()
+        cached = (time.perf_counter() - start) / iterations
+
+    print(f"cold   {cold * 1000:8.3f} ms")
+    print(f"cached {cached * 1000:8.3f} ms")
+    print(f"speedup {cold / cached:6.1f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
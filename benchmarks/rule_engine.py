@@ -0,0 +1,154 @@
+'''
+
+    Times evaluating every library and argument rule of a version json
+    chain with mod_manager.rules against the interpreters it replaced
+
+    python -m benchmarks.rule_engine [version.json ...] [--iterations 2000]
+
+    Without arguments the 1.20 version jsons in META_PATH/minecraft are
+    used, if there are none a chain shaped like 1.20.1 with forge is generated
+
+'''
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+from platform import uname, machine
+from mod_manager import constants, rules, utils
+from benchmarks import launch_plan
+
+NATIVE_OSES = [("windows", "natives-windows"), ("windows", "natives-windows-x86"), ("windows", "natives-windows-arm64"),
+               ("linux", "natives-linux"), ("osx", "natives-macos"), ("osx", "natives-macos-arm64")]
+
+def __legacy_library(lib : dict) -> bool:
+    # what vanilla.get_library_files did, os versions and arches were skipped
+    do_download = True
+    if "rules" in lib:
+        do_download = False
+        for rule in lib["rules"]:
+            if "os" in rule:
+                if "version" not in rule["os"] and rule["os"]["name"] == utils.get_sys_platform():
+                    do_download = rule["action"] == "allow"
+            else:
+                do_download = rule["action"] == "allow"
+    return do_download
+
+def __legacy_arguments(args : list) -> list:
+    # what Instance.__parse_arg_rules did, asking the platform module for every rule
+    new_args = []
+    for arg in args:
+        if not isinstance(arg, dict):
+            new_args.append(arg)
+            continue
+        passed = False
+        for rule in arg["rules"]:
+            if "os" in rule:
+                ospass = True
+                if "name" in rule["os"]:
+                    ospass = ospass and (rule["os"]["name"] == utils.get_sys_platform())
+                if "version" in rule["os"]:
+                    ospass = ospass and (re.match(rule["os"]["version"], uname().release))
+                if "arch" in rule["os"]:
+                    ospass = ospass and (machine().lower().startswith(rule["os"]["arch"]))
+                passed = ospass
+        if passed:
+            new_args += [arg["value"]] if isinstance(arg["value"], str) else arg["value"]
+    return new_args
+
+def __engine(chain : list[dict]):
+    for manifest in chain:
+        for lib in manifest.get("libraries", []):
+            rules.allows(lib.get("rules"))
+        for args in manifest.get("arguments", {}).values():
+            rules.filter_arguments(args)
+
+def __legacy(chain : list[dict]):
+    for manifest in chain:
+        for lib in manifest.get("libraries", []):
+            __legacy_library(lib)
+        for args in manifest.get("arguments", {}).values():
+            __legacy_arguments(args)
+
+def __timed(function, chain : list[dict], iterations : int, before=None) -> float:
+    total = 0.0
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function(chain)
+        total += time.perf_counter() - start
+    return total / iterations
+
+def load_chain(path : str) -> list[dict]:
+    '''
+
+    returns the version json at path followed by the ones it inherits from
+
+    '''
+    chain = []
+    while path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        chain.append(manifest)
+        path = os.path.join(os.path.dirname(path), manifest["inheritsFrom"] + ".json") if "inheritsFrom" in manifest else None
+    return chain
+
+def write_fixture(root : str) -> str:
+    '''
+
+    writes a 1.20.1 + forge chain whose lwjgl natives come in one library per
+    os like the real one, returns the path of the forge version json
+
+    '''
+    launch_plan.write_fixture(root)
+    path = os.path.join(root, "meta", "minecraft", "1.20.1.json")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for name in ["lwjgl", "lwjgl-glfw", "lwjgl-jemalloc", "lwjgl-openal", "lwjgl-opengl", "lwjgl-stb", "lwjgl-tinyfd"]:
+        for os_name, classifier in NATIVE_OSES:
+            path_in_repo = f"org/lwjgl/{name}/3.3.1/{name}-3.3.1-{classifier}.jar"
+            manifest["libraries"].append({
+                "name": f"org.lwjgl:{name}:3.3.1:{classifier}",
+                "downloads": {"artifact": {"path": path_in_repo, "url": f"https://libraries.minecraft.net/{path_in_repo}", "sha1": "0" * 40, "size": 1}},
+                "rules": [{"action": "allow", "os": {"name": os_name}}],
+            })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return os.path.join(root, "meta", "minecraft", "1.20.1-forge-47.1.0.json")
+
+def measure(label : str, chain : list[dict], iterations : int):
+    libraries = [lib for manifest in chain for lib in manifest.get("libraries", [])]
+    arguments = [arg for manifest in chain for args in manifest.get("arguments", {}).values() for arg in args if isinstance(arg, dict)]
+    rule_sets = {json.dumps(entry["rules"], sort_keys=True) for entry in libraries + arguments if entry.get("rules")}
+
+    legacy = __timed(__legacy, chain, iterations)
+    cold = __timed(__engine, chain, iterations, lambda: rules.reset(rules.host()))
+    __engine(chain)
+    warm = __timed(__engine, chain, iterations)
+
+    print(f"{label:<28} {len(libraries):5} {len(arguments):5} {len(rule_sets):5} {legacy * 1e6:10.1f} {cold * 1e6:10.1f} {warm * 1e6:10.1f}")
+
+def main(argv : list[str]):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.rule_engine")
+    parser.add_argument("paths", nargs="*", help="version jsons, their inheritsFrom are read from the same folder")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(glob.glob(os.path.join(constants.META_PATH, "minecraft", "1.20*.json")))
+    print(f"host {rules.host().os_name} {rules.host().os_version} {rules.host().arch}")
+    print(f"{'chain':<28} {'libs':>5} {'args':>5} {'sets':>5} {'legacy us':>10} {'cold us':>10} {'warm us':>10}")
+
+    for path in paths:
+        measure(os.path.basename(path).removesuffix(".json"), load_chain(path), args.iterations)
+
+    if not paths:
+        with tempfile.TemporaryDirectory() as root:
+            measure("synthetic 1.20.1-forge", load_chain(write_fixture(root)), args.iterations)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,327 @@
+'''
+
+    Local stand-in for api.modpacks.ch, piston-meta, the Mojang asset and
+    library hosts, curseforge's cdn and the forge maven
+
+    Every response lives at /<original host>/<original path>, RedirectAdapter
+    sends the shared http session there. The content is synthetic and
+    derived from a seed, files from a fixtures folder laid out the same way
+    (fixtures/api.modpacks.ch/public/modpack/100, ...) take precedence.
+
+'''
+
+import io
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+from mod_manager import constants, http_client
+
+MC_VERSION = "1.20.1"
+FORGE_VERSION = "47.1.0"
+FTB_PACK = "100"
+CURSEFORGE_PACK = "200"
+PACK_VERSION = "1000"
+
+class Catalog():
+    '''
+
+    Synthetic responses keyed by /host/path, scale multiplies the number of files
+
+    '''
+
+    def __init__(self, scale : float = 1.0, seed : int = 0, fixtures : str|None = None):
+        self.rng = random.Random(seed)
+        self.fixtures = fixtures
+        self.bodies : dict[str, bytes] = {}
+        # json documents are never truncated by failure injection
+        self.documents : set[str] = set()
+
+        self.assets = max(1, int(4000 * scale))
+        self.libraries = max(1, int(60 * scale))
+        self.forge_libraries = max(1, int(30 * scale))
+        self.mods = max(1, int(120 * scale))
+        self.configs = max(1, int(200 * scale))
+
+        self.__build_vanilla()
+        self.__build_forge()
+        for platform, pack in (("modpack", FTB_PACK), ("curseforge", CURSEFORGE_PACK)):
+            self.__build_pack(platform, pack)
+
+    def __key(self, url : str) -> str:
+        parts = urlsplit(url)
+        return "/" + parts.netloc + parts.path
+
+    def add(self, url : str, body : bytes, document : bool = False) -> dict:
+        key = self.__key(url)
+        self.bodies[key] = body
+        if document:
+            self.documents.add(key)
+        return {"url": url, "sha1": hashlib.sha1(body).hexdigest(), "size": len(body)}
+
+    def add_json(self, url : str, data) -> dict:
+        return self.add(url, json.dumps(data).encode(), document=True)
+
+    def blob(self, url : str, low : int, high : int) -> dict:
+        return self.add(url, self.rng.randbytes(self.rng.randint(low, high)))
+
+    def __library(self, host : str, group : str, i : int, low : int, high : int) -> dict:
+        path = f"{group.replace('.', '/')}/lib{i}/1.0/lib{i}-1.0.jar"
+        artifact = self.blob(f"https://{host}/{path}", low, high)
+        return {"name": f"{group}:lib{i}:1.0", "downloads": {"artifact": dict(artifact, path=path)}}
+
+    def __build_vanilla(self):
+        objects = {}
+        for i in range(self.assets):
+            body = self.rng.randbytes(self.rng.randint(100, 8000))
+            digest = hashlib.sha1(body).hexdigest()
+            self.add(f"https://resources.download.minecraft.net/{digest[0:2]}/{digest}", body)
+            objects[f"minecraft/sounds/{i}.ogg"] = {"hash": digest, "size": len(body)}
+        asset_index = self.add_json("https://piston-meta.mojang.com/v1/packages/assets/5.json", {"objects": objects})
+
+        client = self.blob("https://piston-data.mojang.com/v1/objects/client/client.jar", 4 * 1024 * 1024, 4 * 1024 * 1024)
+        manifest = {
+            "id": MC_VERSION,
+            "assets": "5",
+            "assetIndex": dict(asset_index, id="5"),
+            "downloads": {"client": client},
+            "mainClass": "net.minecraft.client.main.Main",
+            "libraries": [self.__library("libraries.minecraft.net", "com.mojang", i, 20 * 1024, 400 * 1024) for i in range(self.libraries)],
+            "arguments": {"game": ["--version", "${version_name}"], "jvm": ["-cp", "${classpath}"]},
+        }
+        version = self.add_json(f"https://piston-meta.mojang.com/v1/packages/version/{MC_VERSION}.json", manifest)
+        self.add_json("https://piston-meta.mojang.com/mc/game/version_manifest_v2.json", {
+            "versions": [{"id": MC_VERSION, "type": "release", "url": version["url"], "sha1": version["sha1"]}],
+        })
+
+    def __build_forge(self):
+        version_id = f"{MC_VERSION}-forge-{FORGE_VERSION}"
+        version = {
+            "id": version_id,
+            "inheritsFrom": MC_VERSION,
+            "mainClass": "cpw.mods.bootstraplauncher.BootstrapLauncher",
+            "libraries": [self.__library("maven.minecraftforge.net", "net.minecraftforge", i, 10 * 1024, 200 * 1024) for i in range(self.forge_libraries)],
+            "arguments": {"game": ["--launchTarget", "forgeclient"], "jvm": []},
+        }
+        # no processors, those would need a JVM and the real forge tools
+        install_profile = {
+            "spec": 1,
+            "version": version_id,
+            "json": "/version.json",
+            "minecraft": MC_VERSION,
+            "data": {},
+            "processors": [],
+            "libraries": [self.__library("maven.minecraftforge.net", "net.minecraftforge.installer", i, 10 * 1024, 100 * 1024) for i in range(self.forge_libraries // 2 + 1)],
+        }
+
+        installer = io.BytesIO()
+        with zipfile.ZipFile(installer, "w") as jar:
+            jar.writestr("install_profile.json", json.dumps(install_profile))
+            jar.writestr("version.json", json.dumps(version))
+            jar.writestr("data/client.lzma", self.rng.randbytes(512 * 1024))
+
+        url = f"https://maven.minecraftforge.net/net/minecraftforge/forge/{MC_VERSION}-{FORGE_VERSION}/forge-{MC_VERSION}-{FORGE_VERSION}-installer.jar"
+        artifact = self.add(url, installer.getvalue())
+        self.add(url + ".sha1", artifact["sha1"].encode())
+
+    def __build_pack(self, platform : str, pack : str):
+        files = []
+        for i in range(self.mods):
+            name = f"{platform}-mod{i}.jar"
+            if i % 2:
+                file_id = str(4000000 + i)
+                artifact = self.blob(f"https://edge.forgecdn.net/files/{file_id[0:4]}/{file_id[4:]}/{name}", 20 * 1024, 600 * 1024)
+                files.append({"name": name, "path": "./mods/", "sha1": artifact["sha1"], "size": artifact["size"], "type": "mod",
+                              "curseforge": {"project": 300000 + i, "file": int(file_id)}})
+            else:
+                artifact = self.blob(f"https://dist.creeper.host/{platform}/{name}", 20 * 1024, 600 * 1024)
+                files.append({"name": name, "path": "./mods/", "url": artifact["url"], "sha1": artifact["sha1"], "size": artifact["size"], "type": "mod"})
+
+        if platform == "curseforge":
+            overrides = io.BytesIO()
+            with zipfile.ZipFile(overrides, "w") as zf:
+                for i in range(self.configs):
+                    zf.writestr(f"overrides/config/mod{i}.toml", self.rng.randbytes(self.rng.randint(200, 4000)).hex())
+            artifact = self.add(f"https://dist.creeper.host/{platform}/overrides.zip", overrides.getvalue())
+            files.append({"name": "overrides.zip", "path": "./", "url": artifact["url"], "sha1": artifact["sha1"], "size": artifact["size"], "type": "cf-extract"})
+
+        targets = [{"type": "game", "name": "minecraft", "version": MC_VERSION}, {"type": "modloader", "name": "forge", "version": FORGE_VERSION}]
+        self.add_json(f"https://api.modpacks.ch/public/{platform}/{pack}", {"id": int(pack), "name": f"Bench {platform}", "versions": [{"id": int(PACK_VERSION)}]})
+        self.add_json(f"https://api.modpacks.ch/public/{platform}/{pack}/{PACK_VERSION}", {"id": int(PACK_VERSION), "name": "1.0.0", "files": files, "targets": targets})
+
+    def get(self, key : str) -> bytes|None:
+        if self.fixtures is not None:
+            path = os.path.join(self.fixtures, key.lstrip("/"))
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return self.bodies.get(key)
+
+class Stats():
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes = 0
+            self.failures = 0
+
+    def add(self, nbytes : int = 0, failed : bool = False):
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.failures += failed
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "bytes": self.bytes, "failures": self.failures}
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, don't let them wait for delayed acks
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server : StubServer = self.server
+        key = urlsplit(self.path).path
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        body = server.catalog.get(key)
+        if body is None:
+            self.__send(404, b'{"status": "error", "message": "not found"}')
+            server.stats.add()
+            return
+
+        with server.lock:
+            fail = server.rng.random() < server.failure_rate
+            truncate = fail and key not in server.catalog.documents and server.rng.random() < 0.5
+        if fail and not truncate:
+            self.__send(503, b"")
+            server.stats.add(failed=True)
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            server.stats.add()
+            return
+
+        start = 0
+        status = 200
+        ranged = self.headers.get("Range", "")
+        if ranged.startswith("bytes=") and ranged.endswith("-"):
+            start = int(ranged[6:-1])
+            if start >= len(body):
+                self.__send(416, b"")
+                server.stats.add()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if key in server.catalog.documents else "application/octet-stream")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+
+        end = len(body)
+        if truncate:
+            # drop the connection halfway, the client has to resume
+            end = start + (end - start) // 2
+            self.close_connection = True
+        sent = self.__write(body, start, end, server.bandwidth)
+        server.stats.add(sent, failed=truncate)
+
+    def __send(self, status : int, body : bytes):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __write(self, body : bytes, start : int, end : int, bandwidth : float|None) -> int:
+        chunk = 16 * 1024
+        began = time.monotonic()
+        sent = 0
+        try:
+            for offset in range(start, end, chunk):
+                data = body[offset:min(offset + chunk, end)]
+                self.wfile.write(data)
+                sent += len(data)
+                if bandwidth:
+                    # per connection, like a throttled cdn edge
+                    ahead = sent / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        return sent
+
+class StubServer(ThreadingHTTPServer):
+    '''
+
+    latency in seconds before every response, bandwidth in bytes per second
+    per connection (None is unlimited), failure_rate the share of requests
+    answered with 503 or, for files, cut off halfway
+
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, catalog : Catalog, latency : float = 0.0, bandwidth : float|None = None, failure_rate : float = 0.0, seed : int = 0, port : int = 0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.catalog = catalog
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Stats()
+
+    @property
+    def address(self) -> str:
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+class RedirectAdapter(HTTPAdapter):
+
+    def __init__(self, address : str, **kwargs):
+        self.address = address
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit(("http", self.address, "/" + parts.netloc + parts.path, parts.query, ""))
+        return super().send(request, **kwargs)
+
+def redirect(address : str):
+    '''
+
+    Sends every https request of the shared session to the stub server at address
+
+    '''
+    session = http_client.get_session()
+    retries = session.get_adapter("https://").max_retries
+    session.mount("https://", RedirectAdapter(address, pool_connections=constants.HTTP_POOL_HOSTS, pool_maxsize=constants.HTTP_POOL_SIZE, max_retries=retries))
@@ -1,2 +1 @@
-from . import instances
 from . import constants
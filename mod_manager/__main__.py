@@ -0,0 +1,117 @@
+'''
+
+    Headless command line, python -m mod_manager <command>
+
+    list                                   instances from the index
+    install <platform> <pack> <version>    [--dry-run] [--bandwidth 4M]
+    update <instance> <version>            [--policy keep|overwrite]
+    verify <instance>                      [--repair] [--policy keep|overwrite]
+    launch <instance>
+
+    Every command imports only what it needs, launch reads the instance
+    index and the cached launch plan and never loads the downloaders.
+
+'''
+
+import sys
+import argparse
+
+def __parse_size(value : str) -> float:
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if value[-1].upper() in units:
+        return float(value[:-1]) * units[value[-1].upper()]
+    return float(value)
+
+def __load(name : str):
+    from .instances.instance import Instance
+
+    instance = Instance.load(name)
+    if instance is None:
+        raise SystemExit(f"no instance called {name}")
+    return instance
+
+def list_command(args) -> int:
+    import time
+    from .data_structures import MCVersion, ModLoader
+    from .instances import instance_index
+
+    entries = instance_index.rebuild() if args.rebuild else instance_index.list_instances()
+    print(f"{'name':<32} {'version':<24} {'state':<11} {'MiB':>8}  last launched")
+    for entry in sorted(entries, key=lambda entry: entry["name"].lower()):
+        mc_version = MCVersion.from_dict(entry["mc_version"])
+        version = mc_version.mc_version
+        if mc_version.loader != ModLoader.VANILLA:
+            version += f" {mc_version.loader} {mc_version.loader_version}"
+        size = f"{entry['size'] / 1024 / 1024:8.1f}" if entry.get("size") is not None else f"{'-':>8}"
+        launched = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_launched"])) if entry.get("last_launched") else "never"
+        print(f"{entry['name']:<32} {version:<24} {entry.get('state', ''):<11} {size}  {launched}")
+    return 0
+
+def install_command(args) -> int:
+    from .data_structures import Platform
+    from .instances import planner
+
+    requests = [(Platform(args.platform), args.pack, args.version)]
+    if args.dry_run:
+        planner.dry_run(requests, args.bandwidth)
+        return 0
+
+    install_plan = planner.plan(requests)
+    planner.execute(install_plan)
+    return 1 if install_plan.failed else 0
+
+def update_command(args) -> int:
+    from .data_structures import UpdatePolicy
+
+    diff = __load(args.instance).update(args.version, UpdatePolicy(args.policy))
+    print(diff.to_dict())
+    return 0
+
+def verify_command(args) -> int:
+    from .data_structures import UpdatePolicy
+
+    report = __load(args.instance).verify(args.repair, UpdatePolicy(args.policy))
+    print(report.to_dict())
+    return 0 if report.ok else 1
+
+def launch_command(args) -> int:
+    __load(args.instance).launch()
+    return 0
+
+def main(argv : list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m mod_manager")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="show every instance")
+    list_parser.add_argument("--rebuild", action="store_true", help="read every instance.json again")
+    list_parser.set_defaults(handler=list_command)
+
+    install_parser = commands.add_parser("install", help="create and install a modpack instance")
+    install_parser.add_argument("platform", choices=["ftb", "curse"])
+    install_parser.add_argument("pack")
+    install_parser.add_argument("version")
+    install_parser.add_argument("--dry-run", action="store_true", help="only print what installing would fetch")
+    install_parser.add_argument("--bandwidth", type=__parse_size, default=None, help="bytes per second for the estimate, K / M / G suffixes")
+    install_parser.set_defaults(handler=install_command)
+
+    update_parser = commands.add_parser("update", help="move an instance to another pack version")
+    update_parser.add_argument("instance")
+    update_parser.add_argument("version")
+    update_parser.add_argument("--policy", choices=["keep", "overwrite"], default="keep", help="what happens to pack files you changed")
+    update_parser.set_defaults(handler=update_command)
+
+    verify_parser = commands.add_parser("verify", help="hash every file of an instance")
+    verify_parser.add_argument("instance")
+    verify_parser.add_argument("--repair", action="store_true", help="download missing and corrupt files again")
+    verify_parser.add_argument("--policy", choices=["keep", "overwrite"], default="keep", help="whether pack files you changed count as corrupt")
+    verify_parser.set_defaults(handler=verify_command)
+
+    launch_parser = commands.add_parser("launch", help="start an instance")
+    launch_parser.add_argument("instance")
+    launch_parser.set_defaults(handler=launch_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -17,11 +17,65 @@ ASSETS_PATH = os.path.join(BASE_PATH, "assets")
 LIB_PATH = os.path.join(BASE_PATH, "libraries")
 META_PATH = os.path.join(BASE_PATH, "meta")
 NATIVES_DIR = os.path.join(BASE_PATH, "natives")
+STORE_PATH = os.path.join(BASE_PATH, "store")
 
 INSTANCES_INDEX = os.path.join(INSTANCES_PATH, "index.json")
 
 THREAD_POOL_WORKERS = 8
+MAX_CONNECTIONS_PER_HOST = 6
+# overrides MAX_CONNECTIONS_PER_HOST for single hosts
+HOST_CONNECTION_LIMITS = {
+    "resources.download.minecraft.net": THREAD_POOL_WORKERS,
+}
+# files at least this big are started before the small ones, see downloaders/scheduler
+SCHEDULER_LARGE_FILE = 1024 * 1024
+# pack folders fetched after everything the game needs to start
+SCHEDULER_OPTIONAL_FOLDERS = ["resourcepacks", "shaderpacks"]
+# seconds between two redraws of the terminal progress bar
+PROGRESS_RENDER_INTERVAL = 0.1
 
-# create folders if missing
-for folder in [BASE_PATH, INSTANCES_PATH, ASSETS_PATH, LIB_PATH, META_PATH, os.path.join(META_PATH, "minecraft")]:
-    os.makedirs(folder, exist_ok=True)
+# how pack files are placed from the store into instances, tried in order, copying is the last resort
+STORE_LINK_METHODS = ["reflink", "hardlink"]
+# only files in these instance folders with these extensions are hardlinked, the game and
+# users rewrite everything else (configs, scripts) in place, which would reach every linked copy
+STORE_HARDLINK_FOLDERS = ["mods", "resourcepacks", "shaderpacks"]
+STORE_HARDLINK_EXTENSIONS = [".jar", ".zip"]
+
+# forge install processors that may run at the same time, each one is a JVM
+FORGE_PROCESSOR_WORKERS = 4
+
+# mirror selection, see downloaders/mirrors
+MIRROR_DEMOTE_AFTER = 3
+MIRROR_DEMOTE_SECONDS = 60
+# a fetch taking longer than this many times its estimate is raced against the next mirror, None disables hedging
+MIRROR_HEDGE_FACTOR = 4.0
+MIRROR_HEDGE_MIN_DELAY = 2.0
+
+# read / write size for streamed downloads, bounds the memory used per worker
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# bodies at least this large get a resume journal up front, smaller ones only when interrupted
+DOWNLOAD_JOURNAL_MIN_SIZE = 1024 * 1024
+
+# shared http session, see http_client
+HTTP_POOL_SIZE = THREAD_POOL_WORKERS
+HTTP_POOL_HOSTS = 16
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5
+
+# json metadata younger than this (seconds) is served from META_PATH without revalidating
+METADATA_CACHE_TTL = 600
+# only use cached metadata, never hit the network for it
+OFFLINE_MODE = os.getenv("MODMANAGER_OFFLINE", "") not in ("", "0")
+
+# write a Chrome trace of every install / launch phase here at exit, see tracing
+TRACE_PATH = os.getenv("MODMANAGER_TRACE") or None
+
+def ensure_directories():
+    '''
+
+    creates the data folders if missing, called before installing instead
+    of on import so listing and launching touch nothing
+
+    '''
+    for folder in [BASE_PATH, INSTANCES_PATH, ASSETS_PATH, LIB_PATH, META_PATH, STORE_PATH, os.path.join(META_PATH, "minecraft")]:
+        os.makedirs(folder, exist_ok=True)
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 from typing import List
 import os
 import mod_manager.constants
@@ -51,6 +51,20 @@ class ModLoader(Enum):
         return self._display_name_
 
 
+class UpdatePolicy(Enum):
+    """ what an update does with pack files the user changed (mods always follow the pack) """
+    KEEP_MODIFIED = "keep"
+    OVERWRITE = "overwrite"
+
+
+class InstallState(Enum):
+    """ where an instance is in its installation, kept in the instance index """
+    CREATED = "created"
+    INSTALLING = "installing"
+    INSTALLED = "installed"
+    FAILED = "failed"
+
+
 class MPVersion():
 
     def __init__(self, name : str, mid : str, vid : str):
@@ -83,6 +97,18 @@ class MCVersion():
     @staticmethod
     def from_values(mc : str, loader : ModLoader | str, loader_version : str):
         return MCVersion(mc, loader if loader is ModLoader else ModLoader(str(loader)), loader_version)
+
+    @staticmethod
+    def from_targets(targets : List[dict]):
+        """ reads the "targets" of a modpacks.ch version manifest """
+        game_ver, loader_type, loader_ver = "", "vanilla", ""
+        for target in targets:
+            if target["type"] == "modloader":
+                loader_type = target["name"]
+                loader_ver = target['version']
+            elif target["type"] == "game":
+                game_ver = target["version"]
+        return MCVersion(game_ver, loader_type, loader_ver)
     
     def to_dict(self) -> dict:
         return {"mc": self.mc_version, "loader": str(self.loader), "loader_version": self.loader_version}
@@ -125,8 +151,14 @@ class Colors:
             kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
             del kernel32
 
+class Priority(IntEnum):
+    """ download order classes, lower values are fetched first """
+    LAUNCH = 0
+    REQUIRED = 1
+    OPTIONAL = 2
+
 class File():
-    def __init__(self, url:str|List[str], dest:str, sha1:str|None = None, size:int = 1) -> None:
+    def __init__(self, url:str|List[str], dest:str, sha1:str|None = None, size:int = 0, priority:Priority = Priority.REQUIRED) -> None:
         if isinstance(url, str):
             self.urls = [url]
         else:
@@ -134,7 +166,9 @@ class File():
         
         self.dest = dest
         self.sha1 = sha1
+        # 0 if the size is not known up front
         self.size = size
+        self.priority = priority
     
     @staticmethod
     def from_lib_dict(dict):
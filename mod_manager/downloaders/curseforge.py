@@ -1,12 +1,15 @@
 import os
+from typing import List
 import zipfile
 import shutil
-from distutils.dir_util import copy_tree
-from .. import utils
-from .file_downloader import download_files
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .. import utils, constants, mod_store, tracing
+from . import scheduler
 from ..data_structures import Colors, MPVersion, File
 
-def download(mp_version: MPVersion, directory : str):
+def get_version_manifest(mp_version: MPVersion) -> dict:
     version = -1
 
     modpack_manifest = utils.get_json(f"https://api.modpacks.ch/public/curseforge/{mp_version.modpack_id}")
@@ -24,53 +27,131 @@ def download(mp_version: MPVersion, directory : str):
     if "status" in version_manifest:
         if version_manifest["status"] == "error":
             raise AssertionError(version_manifest["message"])
-   
-    to_download= 0
-    for file in version_manifest["files"]:
-        to_download += file["size"]
-    
-    try:
-        processed_files = []
-        for f in version_manifest["files"]:
-            
 
-            if "curseforge" in f:
-                    urls = __get_curse_urls(f["curseforge"], f["name"])
-            else:
-                urls = [f["url"]]
+    return version_manifest
+
+def get_files(version_manifest : dict, directory : str) -> List[File]:
+    processed_files = []
+    for f in version_manifest["files"]:
 
-            os.makedirs(os.path.join(directory, f["path"]), exist_ok=True)
+        if "curseforge" in f:
+            urls = __get_curse_urls(f["curseforge"], f["name"])
+        else:
+            urls = [f["url"]]
 
-            processed_files.append(File(
-                urls,
-                os.path.join(directory, f["path"], f["name"]),
-                f["sha1"],
-                f["size"],
-            ))
+        processed_files.append(File(
+            urls,
+            os.path.join(directory, f["path"], f["name"]),
+            f["sha1"],
+            f["size"],
+            scheduler.priority_for(f["path"], f.get("optional", False)),
+        ))
+    return processed_files
 
-        download_files(processed_files)
+def install_files(files : List[File]) -> List[File]:
+    '''
+
+    returns the files that failed to download
+
+    '''
+    try:
+        return mod_store.download(files)
     except Exception as e:
         utils.show_cursor()
         print(Colors.END, end="")
         raise e
-    
+
+def download(mp_version: MPVersion, directory : str):
+    with tracing.span("manifest"):
+        version_manifest = get_version_manifest(mp_version)
+
+    with tracing.span("mods"):
+        install_files(get_files(version_manifest, directory))
+
+    extract_overrides(version_manifest, directory)
+
+def __unchanged(info : zipfile.ZipInfo, target : str) -> bool:
+    try:
+        if os.path.getsize(target) != info.file_size:
+            return False
+    except OSError:
+        return False
+
+    crc = 0
+    with open(target, "rb") as f:
+        while chunk := f.read(constants.DOWNLOAD_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc == info.CRC
+
+def __extract_member(zip_path : str, info : zipfile.ZipInfo, target : str, handles : threading.local, opened : List[zipfile.ZipFile]):
+    # one handle per thread so members are inflated in parallel
+    if not hasattr(handles, "zf"):
+        handles.zf = zipfile.ZipFile(zip_path)
+        opened.append(handles.zf)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with handles.zf.open(info) as source, open(target, "wb") as dest:
+        shutil.copyfileobj(source, dest, constants.DOWNLOAD_CHUNK_SIZE)
+
+def extract_overrides(version_manifest : dict, directory : str, overwrite : bool = True, previous : str|None = None):
+    '''
+
+    Streams the overrides of the pack zip straight to their place in
+    directory and removes the zip
+
+    Files whose size and crc already match are not written. With overwrite
+    False existing files are kept if they were changed since the previous
+    overrides zip put them there, or if it isn't known (previous None or gone)
+
+    '''
     print("Extracting overrides")
 
+    root = os.path.abspath(directory)
+
     for f in version_manifest["files"][-1::]:
         if f["type"] != "cf-extract": continue
-        
-        with zipfile.ZipFile(os.path.join(directory, f["path"], f["name"])) as zf:
-            for fpath in zf.namelist():
-                if fpath.startswith("overrides"):
-                    zf.extract(fpath, directory)
-        
-        os.remove(os.path.join(directory, f["path"], f["name"]))
-        
+
+        zip_path = os.path.join(directory, f["path"], f["name"])
+
+        old_members = {}
+        if not overwrite and previous is not None and os.path.exists(previous):
+            with zipfile.ZipFile(previous) as old_zf:
+                old_members = {info.filename: info for info in old_zf.infolist()}
+
+        todo = []
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                if not info.filename.startswith("overrides/") or info.is_dir():
+                    continue
+
+                target = os.path.abspath(os.path.join(root, info.filename.removeprefix("overrides/")))
+                if os.path.commonpath([root, target]) != root:
+                    raise ValueError("Refusing to extract " + info.filename + " outside of " + root)
+
+                if os.path.exists(target):
+                    if __unchanged(info, target):
+                        continue
+                    # only what still is the previous version of the pack's file gets replaced
+                    if not overwrite and (info.filename not in old_members or not __unchanged(old_members[info.filename], target)):
+                        continue
+                todo.append((info, target))
+
+        handles = threading.local()
+        opened = []
+        with tracing.span("overrides") as trace:
+            trace.add(sum(info.file_size for info, _ in todo), len(todo))
+            try:
+                with ThreadPoolExecutor(max_workers=constants.THREAD_POOL_WORKERS) as pool:
+                    for _ in pool.map(lambda member: __extract_member(zip_path, member[0], member[1], handles, opened), todo):
+                        pass
+            finally:
+                for zf in opened:
+                    zf.close()
+
+        os.remove(zip_path)
+
         break
-    
-    copy_tree(os.path.join(directory, "overrides"), directory)
-    shutil.rmtree(os.path.join(directory, "overrides"))
-    
+
     print("Done")
 
 def __get_curse_urls(data : dict[str, str], name : str):
@@ -79,4 +160,3 @@ def __get_curse_urls(data : dict[str, str], name : str):
             f"https://www.curseforge.com/api/v1/mods/{str(data['project'])[0:4]}/files/{str(data['file'])}/download"]
             
     return urls
-    
\ No newline at end of file
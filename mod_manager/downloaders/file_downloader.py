@@ -1,81 +1,194 @@
 import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from typing import List, Tuple
-from multiprocessing import Pool, Queue, Process
-from .. import utils, constants
+from urllib.parse import urlsplit
+import requests
+from .. import utils, constants, file_index, events, tracing
 from ..data_structures import Colors, File
+from . import mirrors, scheduler
 
-__downloaded_files: Queue
+# the engine lives for the whole process, every download_files call shares its workers
+__executor : ThreadPoolExecutor|None = None
+__executor_lock = threading.Lock()
+__host_slots : dict[str, threading.Semaphore] = {}
 
-def download_files(files:List[File]):
-    global __downloaded_files
-    __downloaded_files = Queue()
-    to_download = 0
-    for file in files:
-        to_download += file.size
+def __get_executor() -> ThreadPoolExecutor:
+    global __executor
+    with __executor_lock:
+        if __executor is None:
+            __executor = ThreadPoolExecutor(max_workers=constants.THREAD_POOL_WORKERS, thread_name_prefix="download")
+        return __executor
 
-    utils.hide_cursor()
+def __host_slot(url : str) -> threading.Semaphore:
+    host = urlsplit(url).netloc
+    with __executor_lock:
+        if host not in __host_slots:
+            __host_slots[host] = threading.Semaphore(scheduler.host_limit(host))
+        return __host_slots[host]
 
-    progress_watcher = Process(target=__progress_indicator, args=[to_download])
-    progress_watcher.start()
+def download_files(files:List[File], show_progress : bool = True) -> List[Tuple[bool, File, bool]]:
+    '''
 
-    with Pool(processes=constants.THREAD_POOL_WORKERS) as pool:
-        pool.map(__download_file_thread, files)
+    Downloads files in the order picked by the scheduler, see scheduler.plan
 
+    Progress is reported through events, show_progress additionally draws
+    it to the terminal for the duration of the batch
 
-    __downloaded_files.put(("kys", "kys", "kys"))
-    progress_watcher.join()
-    progress_watcher.close()
+    returns a List of Tuples (had_success, file, has_skipped) in the same order as files
 
-    __downloaded_files.close()
+    '''
+    unique = list({id(file): file for file in files}.values())
 
-    utils.show_cursor()
-    print()
+    renderer = None
+    if show_progress:
+        renderer = events.subscribe(events.TerminalRenderer(batch))
+        utils.hide_cursor()
 
-def __download_file_thread(file :File):
-    global __downloaded_files
-
-    result : Tuple = (False, file, False)
-    for url in file.urls:
+    executor = __get_executor()
+    plan = scheduler.Scheduler(unique)
+    batch = events.new_batch()
+    futures : dict[Future, File] = {}
+    results : dict[int, Tuple] = {}
 
+    with tracing.span("download", requested=len(unique)) as trace:
+        events.emit(events.EventType.BATCH_STARTED, files=unique, batch=batch)
         try:
-            result = download_file(file, url)
-            if result[0]:
-                break
-        except Exception as e:
+            while plan.has_pending() or futures:
+                while len(futures) < constants.THREAD_POOL_WORKERS:
+                    file = plan.next()
+                    if file is None:
+                        break
+                    futures[executor.submit(__download_file_thread, file, batch)] = file
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    plan.done(futures.pop(future))
+                    result = future.result()
+                    results[id(result[1])] = result
+        except BaseException as e:
+            for future in futures:
+                future.cancel()
             print(Colors.END, end="")
-            utils.show_cursor()
             raise e
+        finally:
+            file_index.save()
+            mirrors.save()
+            events.emit(events.EventType.BATCH_FINISHED, files=unique, batch=batch)
+            if renderer is not None:
+                events.unsubscribe(renderer)
+                utils.show_cursor()
+                print()
+
+        if tracing.is_enabled():
+            for success, file, skipped in results.values():
+                if success and not skipped:
+                    trace.add(file.size, 1)
+            trace.set(skipped=sum(1 for _, _, skipped in results.values() if skipped), failed=sum(1 for success, _, _ in results.values() if not success))
+
+    return [results[id(file)] for file in files]
+
+def __download_file_thread(file :File, batch : int) -> Tuple[bool, File, bool]:
+    events.emit(events.EventType.FILE_STARTED, file, batch=batch)
 
-    __downloaded_files.put(result)
+    result : Tuple = (False, file, False)
+    url = None
+    urls = mirrors.rank(file.urls, file.size)
+    while urls:
+        url = urls[0]
+        if len(urls) > 1:
+            result, urls = __hedged_download(file, urls, batch)
+        else:
+            result = __attempt(file, urls.pop(0), batch)
+        if result[0]:
+            break
 
-def download_file(file : File, url : str|None = None):
+    if not result[0]:
+        events.emit(events.EventType.FILE_FAILED, file, url, batch=batch)
+    elif result[2]:
+        events.emit(events.EventType.FILE_SKIPPED, file, url, file.size, batch=batch)
+    else:
+        events.emit(events.EventType.FILE_FINISHED, file, url, file.size, batch=batch)
+
+    return result
+
+def __attempt(file : File, url : str, batch : int, part_suffix : str = ".part", cancel : threading.Event|None = None) -> Tuple[bool, File, bool]:
+    started = time.monotonic()
+    try:
+        with __host_slot(url):
+            result = download_file(file, url, part_suffix, cancel, lambda nbytes: events.emit(events.EventType.FILE_PROGRESS, file, url, nbytes, batch=batch))
+    except requests.RequestException:
+        mirrors.report_failure(url)
+        return (False, file, False)
+
+    if result[0]:
+        if not result[2]:
+            mirrors.report_success(url, time.monotonic() - started, file.size)
+    elif cancel is None or not cancel.is_set():
+        mirrors.report_failure(url)
+    return result
+
+def __hedged_download(file : File, urls : List[str], batch : int) -> Tuple[Tuple[bool, File, bool], List[str]]:
+    '''
+
+    Fetches file from urls[0], racing it against urls[1] if it takes much
+    longer than the host's estimate. The loser is cancelled.
+
+    returns Tuple (result, urls that were not tried)
+
+    '''
+    delay = mirrors.hedge_delay(urls[0], file.size)
+    if delay is None:
+        return __attempt(file, urls[0], batch), urls[1:]
+
+    finished : queue.Queue = queue.Queue()
+    cancels = [threading.Event(), threading.Event()]
+
+    def run(index, part_suffix):
+        # whatever __attempt raises is handed over too, otherwise the waits below never return
+        try:
+            finished.put((index, __attempt(file, urls[index], batch, part_suffix, cancels[index])))
+        except BaseException as e:
+            finished.put((index, e))
+
+    started = time.monotonic()
+    threading.Thread(target=run, args=(0, ".part"), daemon=True).start()
+    try:
+        _, result = finished.get(timeout=delay)
+    except queue.Empty:
+        result = None
+    if result is not None:
+        # like an unhedged attempt, an error that isn't the mirror's fault propagates
+        if isinstance(result, BaseException):
+            raise result
+        return result, urls[1:]
+
+    threading.Thread(target=run, args=(1, ".hedge.part"), daemon=True).start()
+
+    index, result = finished.get()
+    if not isinstance(result, BaseException) and result[0]:
+        cancels[1 - index].set()
+        if index == 1:
+            mirrors.report_slow(urls[0], time.monotonic() - started, file.size)
+        return result, urls[2:]
+
+    # the first one to finish failed, the other one is the last hope among these two
+    _, other = finished.get()
+    if not isinstance(other, BaseException) and other[0]:
+        return other, urls[2:]
+    for outcome in (result, other):
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return other, urls[2:]
+
+def download_file(file : File, url : str|None = None, part_suffix : str = ".part", cancel : threading.Event|None = None, progress = None):
     if url == None:
         url = file.urls[0]
-    
+
     os.makedirs(file.dest.removesuffix(file.dest.split(os.sep)[-1]), exist_ok=True)
 
-    success, skipped = utils.download_file(url, file.dest, file.sha1)
+    success, skipped = utils.download_file(url, file.dest, file.sha1, size=file.size or None, part_suffix=part_suffix, cancel=cancel, progress=progress)
 
     return (success, file, skipped)
-
-def __progress_indicator(to_download):
-    global __downloaded_files
-    done_downloading = 0
-    while done_downloading<to_download:
-
-        success, file, skipped = __downloaded_files.get()
-
-        if success == "kys":
-            break
-
-        if not success:
-
-            utils.print_with_progress(file.dest.split("/")[-1] + Colors.RED + " ERROR" + Colors.END, done_downloading/to_download, offset=0)
-            to_download -= file.size
-            return
-
-        done_downloading += file.size
-
-        statustext = " SKIPPING" if skipped else " OK"
-
-        utils.print_with_progress(file.dest.split("/")[-1] + Colors.GREEN + statustext + Colors.END, done_downloading/to_download, offset=0)
@@ -1,10 +1,11 @@
 import os
+from typing import List
 
-from .. import utils
-from .file_downloader import download_files
+from .. import utils, mod_store, tracing
+from . import scheduler
 from ..data_structures import Colors, MPVersion, File
 
-def download(mp_version: MPVersion, directory : str):
+def get_version_manifest(mp_version: MPVersion) -> dict:
     version = -1
 
     modpack_manifest = utils.get_json(f"https://api.modpacks.ch/public/modpack/{mp_version.modpack_id}")
@@ -22,40 +23,50 @@ def download(mp_version: MPVersion, directory : str):
     if "status" in version_manifest:
         if version_manifest["status"] == "error":
             raise AssertionError(version_manifest["message"])
-   
-    to_download= 0
-    for file in version_manifest["files"]:
-        to_download += file["size"]
-    
-    try:
-        processed_files = []
-        for f in version_manifest["files"]:
-            
 
-            if "curseforge" in f:
-                    urls = __get_curse_urls(f["curseforge"], f["name"])
-            else:
-                urls = [f["url"]]
+    return version_manifest
+
+def get_files(version_manifest : dict, directory : str) -> List[File]:
+    processed_files = []
+    for f in version_manifest["files"]:
+
+        if "curseforge" in f:
+            urls = __get_curse_urls(f["curseforge"], f["name"])
+        else:
+            urls = [f["url"]]
 
-            os.makedirs(os.path.join(directory, f["path"]), exist_ok=True)
+        processed_files.append(File(
+            urls,
+            os.path.join(directory, f["path"], f["name"]),
+            f["sha1"],
+            f["size"],
+            scheduler.priority_for(f["path"], f.get("optional", False)),
+        ))
+    return processed_files
 
-            processed_files.append(File(
-                urls,
-                os.path.join(directory, f["path"], f["name"]),
-                f["sha1"],
-                f["size"],
-            ))
+def install_files(files : List[File]) -> List[File]:
+    '''
 
-        download_files(processed_files)
+    returns the files that failed to download
+
+    '''
+    try:
+        return mod_store.download(files)
     except Exception as e:
         utils.show_cursor()
         print(Colors.END, end="")
         raise e
 
+def download(mp_version: MPVersion, directory : str):
+    with tracing.span("manifest"):
+        version_manifest = get_version_manifest(mp_version)
+
+    with tracing.span("mods"):
+        install_files(get_files(version_manifest, directory))
+
 def __get_curse_urls(data : dict[str, str], name : str):
 
     urls = [f"https://edge.forgecdn.net/files/{str(data['file'])[0:4]}/{str(data['file'])[4::]}/{name}",
             f"https://www.curseforge.com/api/v1/mods/{str(data['project'])[0:4]}/files/{str(data['file'])}/download"]
             
     return urls
-    
\ No newline at end of file
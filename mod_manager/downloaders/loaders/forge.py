@@ -2,16 +2,39 @@ import json
 import re
 import os
 import subprocess
-import tempfile
 import shutil
+import time
+import threading
 import zipfile as zp
+from hashlib import sha1
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import requests
 
 from mod_manager.data_structures import File
-from mod_manager import constants, utils
+from mod_manager import constants, utils, file_index, http_client, tracing
 from mod_manager.downloaders import vanilla
 from mod_manager.downloaders.file_downloader import download_file, download_files
 
+# installers, their unpacked profiles and install markers, one folder per forge version
+CACHE_PATH = os.path.join(constants.META_PATH, "forge")
+# invocations of processors without declared outputs that finished successfully
+PROCESSOR_STAMPS = os.path.join(CACHE_PATH, "processors.json")
+VAR_PATTERN = re.compile(r"\{(\w+)\}")
+
+__main_classes : dict[str, str] = {}
+
 def __get_main_function(jar_path):
+    # the same tool jars show up in most processors of a profile
+    if jar_path in __main_classes:
+        return __main_classes[jar_path]
+    main_class = __read_main_function(jar_path)
+    # a jar that is missing or broken now may be fetched again later
+    if main_class is not None:
+        __main_classes[jar_path] = main_class
+    return main_class
+
+def __read_main_function(jar_path):
     try:
         with zp.ZipFile(jar_path, 'r') as jar_file:
             manifest_data = jar_file.read('META-INF/MANIFEST.MF').decode('utf-8')
@@ -29,11 +52,17 @@ def __get_main_function(jar_path):
         return None
 
 
-def __library_to_path(library_name, library_data):
-    for lib in library_data["libraries"]:
-        if lib["name"] == library_name:
-            return lib["downloads"]["artifact"]["path"]
-    return None
+def library_index(install_profile : dict) -> dict[str, str]:
+    '''
+
+    returns maven coordinate -> library path for every library of install_profile
+
+    '''
+    index = {}
+    for lib in install_profile["libraries"]:
+        # the first entry wins like the linear lookup did
+        index.setdefault(lib["name"], lib["downloads"]["artifact"]["path"])
+    return index
 
 def transform_maven_string(input_string):
     # de.oceanlabs.mcp:mcp_config:1.18.2-20220404.173914@zip
@@ -65,25 +94,75 @@ def __download_v0(install_profile, version_manifest, tempdir, installerpath):
     print("downloading version libs")
     vanilla.download_from_manifest(version_manifest["id"])
 
-    for lib in install_profile["libraries"]:
-        lib = lib["downloads"]["artifact"]
-        if lib["url"] == "":
-            with zp.ZipFile(installerpath) as zf:
-                for file in zf.namelist():
-                    if lib["path"] in file:
-                        source = zf.open(file)
-                        target = open(os.path.join(constants.LIB_PATH, lib["path"]), "wb")
-                        with source, target:
-                            shutil.copyfileobj(source, target)
-
-def __download_v1(install_profile, version_manifest, tempdir):
-    side = "client"
-    
-    print("downloading libs")
-    vanilla.download_libraries(install_profile, install_profile["version"])
-    print("downloading version libs")
-    vanilla.download_from_manifest(version_manifest["id"])
-
+    bundled = [lib["downloads"]["artifact"] for lib in install_profile["libraries"] if lib["downloads"]["artifact"]["url"] == ""]
+    if not bundled:
+        return
+
+    with zp.ZipFile(installerpath) as zf:
+        members = zf.namelist()
+        # bundled libraries live under maven/ in the installer
+        by_path = {}
+        for member in members:
+            by_path.setdefault(member.removeprefix("maven/"), member)
+
+        for lib in bundled:
+            member = by_path.get(lib["path"])
+            if member is None:
+                member = next((file for file in members if lib["path"] in file), None)
+            if member is None:
+                continue
+            target_path = os.path.join(constants.LIB_PATH, lib["path"])
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with zf.open(member) as source, open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+
+class Processor():
+
+    def __init__(self, index : int, jar : str, main_class : str|None, classpath : List[str], args : List[str], outputs : dict[str, str], key : str):
+        self.index = index
+        self.jar = jar
+        self.main_class = main_class
+        self.classpath = classpath
+        self.args = args
+        # path -> sha1 as declared by the install profile
+        self.outputs = outputs
+        # identifies the exact invocation across installs
+        self.key = key
+
+        self.paths = {arg for arg in args if os.path.isabs(arg)}
+        self.produces = set(outputs.keys())
+        for flag, value in zip(args, args[1:]):
+            if flag.startswith("--out") or flag in ("--slim", "--extra"):
+                self.produces.add(value)
+
+    @property
+    def name(self) -> str:
+        return self.jar.split(":")[1] if ":" in self.jar else self.jar
+
+    def depends_on(self, other) -> bool:
+        # processors we can't tell anything about run strictly in order
+        if not self.produces or not other.produces:
+            return True
+        return bool(other.produces & self.paths or self.produces & other.paths or self.produces & other.produces)
+
+def __resolve(value : str, proc_vars : dict, tempdir : str) -> str:
+    # one pass over the value instead of one replace per data entry
+    value = VAR_PATTERN.sub(lambda match: str(proc_vars[match.group(1)]) if match.group(1) in proc_vars else match.group(0), value)
+    if value.startswith("/data"):
+        value = os.path.join(tempdir, value.removeprefix("/"))
+
+    # 'quoted' values are literals, like the expected sha1 of an output
+    if len(value) > 1 and value.startswith("'") and value.endswith("'"):
+        return value[1:-1]
+
+    return re.sub(r'\[([^[\]]*)\]', lambda match: f"{transform_maven_string(match.group(1))}", value)
+
+def plan_processors(install_profile : dict, tempdir : str, side : str = "client") -> List[Processor]:
+    '''
+
+    Resolves every processor of a spec 1 install profile for side
+
+    '''
     proc_vars = {}
 
     proc_vars["MINECRAFT_JAR"] = os.path.join(constants.LIB_PATH, "net", "minecraft", "client", install_profile["minecraft"]+".jar")
@@ -95,83 +174,257 @@ def __download_v1(install_profile, version_manifest, tempdir):
         else:
             raise ValueError("Invalid / unknown data dict structure")
 
+    libraries = library_index(install_profile)
 
-    for proc in install_profile["processors"]:
+    processors = []
+    for index, proc in enumerate(install_profile["processors"]):
         if "sides" in proc:
             if not side in proc["sides"]:
                 continue
         
-        path = __library_to_path(proc["jar"], install_profile)
-
-        success = os.path.exists(os.path.join(constants.LIB_PATH, path)) if path != None else False
-        
-        #print("[  OK   ]" if success else "[ ERROR ]", path)
+        path = libraries.get(proc["jar"])
         
         if path == None:
             raise FileNotFoundError("Processor not found " + proc["jar"])
 
-        args = []
-        for arg in proc["args"]:
-
-            new_arg:str = arg
-            for key, val in proc_vars.items():
-
-                placeholder = f"{{{key}}}"
-                new_arg = new_arg.replace(placeholder, str(val))
-            if new_arg.startswith("/data"):
-                new_arg = os.path.join(tempdir, new_arg.removeprefix("/"))
-            
-            new_arg = re.sub(r'\[([^[\]]*)\]', lambda match: f"{transform_maven_string(match.group(1))}", new_arg)
-            #print(new_arg)
-            args.append(new_arg)
+        args = [__resolve(arg, proc_vars, tempdir) for arg in proc["args"]]
         
         classpath = []
         classpath.append(os.path.join(constants.LIB_PATH, path))
         for lib in proc["classpath"]:
-            lpath = __library_to_path(lib, install_profile)
+            lpath = libraries.get(lib)
             if lpath == None: continue
             lpath = os.path.join(constants.LIB_PATH, lpath)
             if os.path.exists(lpath):
                 classpath.append(lpath)
 
-        classpath = utils.get_cp_sep().join(classpath)
+        outputs = {__resolve(k, proc_vars, tempdir): __resolve(v, proc_vars, tempdir) for k, v in proc.get("outputs", {}).items()}
 
-        subprocess.call(["java", "-cp", classpath, __get_main_function(os.path.join(constants.LIB_PATH, path))] + args)
-        
+        # the extracted installer data moves between installs, keep it out of the key
+        key = sha1(json.dumps([proc["jar"], [arg.replace(tempdir, "{INSTALLER}") for arg in args]]).encode()).hexdigest()
 
+        processors.append(Processor(index, proc["jar"], __get_main_function(os.path.join(constants.LIB_PATH, path)), classpath, args, outputs, key))
 
-def download(forge_version_name, mc_version_name):
-    print("Forge download start")
-    tempdir = tempfile.mkdtemp(suffix="modmanager")
+    return processors
+
+def __outputs_valid(processor : Processor, stamps : dict) -> bool:
+    if processor.outputs:
+        return all(file_index.check(path, sha) for path, sha in processor.outputs.items())
+    # nothing declared, trust an earlier identical run as long as what it wrote is still there
+    return processor.key in stamps and all(os.path.exists(path) for path in processor.produces)
+
+def __run_processor(processor : Processor, stamps : dict, stamps_lock : threading.Lock, parent) -> dict:
+    with stamps_lock:
+        skip = __outputs_valid(processor, stamps)
+    if skip:
+        return {"processor": processor.name, "status": "skipped", "seconds": 0.0}
+
+    with tracing.span(processor.name, parent=parent):
+        started = time.perf_counter()
+        returncode = subprocess.call(["java", "-cp", utils.get_cp_sep().join(processor.classpath), processor.main_class] + processor.args)
+        seconds = time.perf_counter() - started
+
+    status = "ok" if returncode == 0 else f"failed ({returncode})"
+    if returncode == 0 and all(file_index.check(path, sha) for path, sha in processor.outputs.items()):
+        with stamps_lock:
+            stamps[processor.key] = time.time()
+    elif returncode == 0:
+        status = "bad output"
+
+    return {"processor": processor.name, "status": status, "seconds": seconds}
+
+def run_processors(processors : List[Processor]) -> List[dict]:
+    '''
+
+    Runs processors whose outputs aren't there yet, independent ones concurrently
+
+    returns a timing report per processor in install profile order
+
+    '''
+    try:
+        with open(PROCESSOR_STAMPS, "r", encoding="utf-8") as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        stamps = {}
+    stamps_lock = threading.Lock()
+
+    deps = {p.index: {o.index for o in processors if o.index < p.index and p.depends_on(o)} for p in processors}
+
+    report = {}
+    done = set()
+    # processors that failed or were skipped because of one, whatever depends on them doesn't run
+    failed = set()
+    pending = list(processors)
+    running : dict[Future, Processor] = {}
+    with tracing.span("processors", count=len(processors)) as trace, ThreadPoolExecutor(max_workers=constants.FORGE_PROCESSOR_WORKERS) as pool:
+        while pending or running:
+            for processor in list(pending):
+                if deps[processor.index] & failed:
+                    pending.remove(processor)
+                    report[processor.index] = {"processor": processor.name, "status": "skipped (dependency failed)", "seconds": 0.0}
+                    done.add(processor.index)
+                    failed.add(processor.index)
+                elif deps[processor.index] <= done:
+                    pending.remove(processor)
+                    running[pool.submit(__run_processor, processor, stamps, stamps_lock, trace)] = processor
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                processor = running.pop(future)
+                report[processor.index] = future.result()
+                done.add(processor.index)
+                if report[processor.index]["status"] not in ("ok", "skipped"):
+                    failed.add(processor.index)
+
+    os.makedirs(os.path.dirname(PROCESSOR_STAMPS), exist_ok=True)
+    with open(PROCESSOR_STAMPS, "w", encoding="utf-8") as f:
+        json.dump(stamps, f)
+    file_index.save()
+
+    report = [report[processor.index] for processor in processors]
+    for entry in report:
+        print(f"{entry['seconds']:8.2f}s {entry['status']:<12} {entry['processor']}")
+    return report
+
+def __download_v1(install_profile, version_manifest, tempdir) -> bool:
+    print("downloading libs")
+    vanilla.download_libraries(install_profile, install_profile["version"])
+    print("downloading version libs")
+    vanilla.download_from_manifest(version_manifest["id"])
+
+    report = run_processors(plan_processors(install_profile, tempdir))
+    return all(entry["status"] in ("ok", "skipped") for entry in report)
+
+def get_cache_dir(forge_version_name, mc_version_name) -> str:
+    return os.path.join(CACHE_PATH, f"{mc_version_name}-{forge_version_name}")
 
-    if re.search(r"(1\.10$|1\.9|1\.8|1\.7|1\.6|1\.5|1\.4|1\.3|1\.2|1\.1$)", mc_version_name) is None:
-        forge_url = f"https://maven.minecraftforge.net/net/minecraftforge/forge/{mc_version_name}-{forge_version_name}/forge-{mc_version_name}-{forge_version_name}-installer.jar"
-    else:
-        forge_url = f"https://maven.minecraftforge.net/net/minecraftforge/forge/{mc_version_name}-{forge_version_name}-{mc_version_name}/forge-{mc_version_name}-{forge_version_name}-{mc_version_name}-installer.jar"
+def __installer_url(forge_version_name, mc_version_name) -> str:
+    # 1.1 - 1.10 installers carry the mc version a second time
+    if re.fullmatch(r"1\.([1-9](\.\d+)?|10)", mc_version_name) is None:
+        return f"https://maven.minecraftforge.net/net/minecraftforge/forge/{mc_version_name}-{forge_version_name}/forge-{mc_version_name}-{forge_version_name}-installer.jar"
+    return f"https://maven.minecraftforge.net/net/minecraftforge/forge/{mc_version_name}-{forge_version_name}-{mc_version_name}/forge-{mc_version_name}-{forge_version_name}-{mc_version_name}-installer.jar"
 
-    installerpath = os.path.join(tempdir, forge_url.split("/")[-1])
+def __installer_sha1(forge_url) -> str|None:
+    if constants.OFFLINE_MODE:
+        return None
+    try:
+        r = http_client.get_session().get(forge_url + ".sha1", timeout=constants.JSON_REQUEST_TIMEOUT)
+    except requests.RequestException:
+        return None
+    sha = r.text.strip()
+    return sha if r.ok and re.fullmatch(r"[0-9a-f]{40}", sha) else None
 
-    # download the installer jar
-    download_file(File(forge_url, installerpath))
+def __load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    if not zp.is_zipfile(installerpath): raise zp.BadZipFile("Downloaded installer at " + installerpath + " is not a valid zip file")
+def __write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
 
+def __extract_installer(installerpath, cache_dir):
     with zp.ZipFile(installerpath) as installer_jar:
         with installer_jar.open("install_profile.json") as f:
             install_profile = json.load(f)
-        with installer_jar.open(install_profile["json"].removeprefix(os.sep)) as f:
+        with installer_jar.open(install_profile["json"].removeprefix("/")) as f:
             version_manifest = json.load(f)
-            with open(os.path.join(constants.META_PATH, "minecraft", version_manifest["id"] + ".json"), "w") as f:
-                json.dump(version_manifest, f)
-        
+
         for file in installer_jar.namelist():
             if file.startswith("data/"):
-                installer_jar.extract(file, tempdir)
-    
-    if install_profile["spec"] == 0:
-        __download_v0(install_profile, version_manifest, tempdir, installerpath)
-    elif install_profile["spec"] == 1:
-        __download_v1(install_profile, version_manifest, tempdir)
+                installer_jar.extract(file, cache_dir)
+
+    # the profile is written last, its presence means the extraction finished
+    __write_json(os.path.join(cache_dir, "version.json"), version_manifest)
+    __write_json(os.path.join(cache_dir, "install_profile.json"), install_profile)
+
+def __publish_version(cache_dir) -> dict:
+    version_manifest = __load_json(os.path.join(cache_dir, "version.json"))
+    path = os.path.join(constants.META_PATH, "minecraft", version_manifest["id"] + ".json")
+    # a stale or truncated copy from an earlier run is replaced too
+    if __load_json(path) != version_manifest:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        __write_json(path, version_manifest)
+    return version_manifest
+
+def is_installed(forge_version_name, mc_version_name) -> bool:
+    cache_dir = get_cache_dir(forge_version_name, mc_version_name)
+    return __load_json(os.path.join(cache_dir, "installed.json")) is not None and os.path.exists(os.path.join(cache_dir, "version.json"))
+
+def prepare(forge_version_name, mc_version_name) -> Tuple[dict, dict]:
+    '''
 
-    # delete the installer after finishing
-    shutil.rmtree(tempdir)
\ No newline at end of file
+    Makes sure the installer of a forge version is downloaded and unpacked
+    into get_cache_dir and its version json is in META_PATH
+
+    returns Tuple (install profile, version json)
+
+    '''
+    cache_dir = get_cache_dir(forge_version_name, mc_version_name)
+    profile_path = os.path.join(cache_dir, "install_profile.json")
+
+    if not is_installed(forge_version_name, mc_version_name):
+        os.makedirs(cache_dir, exist_ok=True)
+        forge_url = __installer_url(forge_version_name, mc_version_name)
+        installerpath = os.path.join(cache_dir, forge_url.split("/")[-1])
+
+        installer_sha1 = __installer_sha1(forge_url)
+        # without a checksum from maven an installer unpacked before is trusted as is
+        if installer_sha1 is not None or not os.path.exists(profile_path):
+            success, _, skipped = download_file(File(forge_url, installerpath, installer_sha1))
+            if not success:
+                raise ConnectionError("Could not download the forge installer " + forge_url)
+
+            if not zp.is_zipfile(installerpath): raise zp.BadZipFile("Downloaded installer at " + installerpath + " is not a valid zip file")
+
+            # a new installer (or a first install) invalidates what was unpacked
+            if not skipped or not os.path.exists(profile_path):
+                if os.path.exists(profile_path):
+                    os.remove(profile_path)
+                __extract_installer(installerpath, cache_dir)
+
+    return __load_json(profile_path), __publish_version(cache_dir)
+
+def get_files(forge_version_name, mc_version_name) -> List[File]:
+    '''
+
+    returns the libraries the install profile needs, the ones of the version
+    json are part of vanilla.get_files of its id
+
+    '''
+    install_profile, _ = prepare(forge_version_name, mc_version_name)
+    return vanilla.get_library_files(install_profile)[0]
+
+def download(forge_version_name, mc_version_name):
+    '''
+
+    Installs a forge version through the cache at get_cache_dir
+
+    The installer, its profile, version json and data/ are kept there, a
+    version that was fully installed before is only republished
+
+    '''
+    print("Forge download start")
+    if is_installed(forge_version_name, mc_version_name):
+        __publish_version(get_cache_dir(forge_version_name, mc_version_name))
+        print("Forge " + mc_version_name + "-" + forge_version_name + " already installed")
+        return
+
+    with tracing.span("forge", version=mc_version_name + "-" + forge_version_name):
+        with tracing.span("installer"):
+            install_profile, version_manifest = prepare(forge_version_name, mc_version_name)
+        cache_dir = get_cache_dir(forge_version_name, mc_version_name)
+
+        installed = True
+        if install_profile["spec"] == 0:
+            installerpath = os.path.join(cache_dir, __installer_url(forge_version_name, mc_version_name).split("/")[-1])
+            __download_v0(install_profile, version_manifest, cache_dir, installerpath)
+        elif install_profile["spec"] == 1:
+            installed = __download_v1(install_profile, version_manifest, cache_dir)
+
+        if installed:
+            __write_json(os.path.join(cache_dir, "installed.json"), {"version": version_manifest["id"], "installed_at": time.time()})
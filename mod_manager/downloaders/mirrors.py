@@ -0,0 +1,212 @@
+'''
+
+    Per-host latency / throughput / error scores shared by every download of the run
+
+    Files with several urls are sent to the host that is expected to finish
+    them first, hosts that keep failing are pushed to the back for a while
+
+    The measurements are saved to STATS_PATH at the end of every batch and
+    loaded on first use, so a new process starts from what earlier runs saw
+
+'''
+
+import os
+import json
+import time
+import threading
+from typing import List
+from urllib.parse import urlsplit
+from .. import constants
+
+STATS_PATH = os.path.join(constants.META_PATH, "mirrors.json")
+
+# weight of the newest sample in the moving averages
+__EWMA_WEIGHT = 0.3
+# below this size a transfer mostly measures latency, above it mostly throughput
+__SMALL_FILE = 64 * 1024
+
+class HostStats():
+
+    # assumed until the host has been measured
+    DEFAULT_LATENCY = 0.2
+    DEFAULT_THROUGHPUT = 1024 * 1024
+
+    def __init__(self, host : str):
+        self.host = host
+        self.latency : float|None = None
+        self.throughput : float|None = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.demoted_until = 0.0
+
+    def estimate(self, size : int) -> float:
+        latency = self.latency if self.latency is not None else HostStats.DEFAULT_LATENCY
+        throughput = self.throughput if self.throughput is not None else HostStats.DEFAULT_THROUGHPUT
+        return latency + size / throughput
+
+    def is_measured(self) -> bool:
+        return self.latency is not None and self.throughput is not None
+
+    def is_demoted(self) -> bool:
+        return self.demoted_until > time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            "host": self.host,
+            "latency": self.latency,
+            "throughput": self.throughput,
+            "successes": self.successes,
+            "failures": self.failures,
+            "demoted": self.is_demoted(),
+        }
+
+__hosts : dict[str, HostStats]|None = None
+__dirty = False
+__lock = threading.Lock()
+
+# what is kept between runs, demotions only last for the current one
+__SAVED_FIELDS = ["latency", "throughput", "successes", "failures"]
+
+def __load() -> dict[str, HostStats]:
+    global __hosts
+    if __hosts is None:
+        __hosts = {}
+        try:
+            with open(STATS_PATH, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        for host, values in saved.items():
+            stats = HostStats(host)
+            for field in __SAVED_FIELDS:
+                setattr(stats, field, values.get(field, getattr(stats, field)))
+            __hosts[host] = stats
+    return __hosts
+
+def __ewma(old : float|None, sample : float) -> float:
+    if old is None:
+        return sample
+    return old + __EWMA_WEIGHT * (sample - old)
+
+def __stats(url : str) -> HostStats:
+    host = urlsplit(url).netloc
+    hosts = __load()
+    if host not in hosts:
+        hosts[host] = HostStats(host)
+    return hosts[host]
+
+def rank(urls : List[str], size : int = 0) -> List[str]:
+    '''
+
+    returns urls ordered by how fast their host is expected to deliver size bytes
+
+    Hosts without samples go first so every mirror gets measured once,
+    demoted hosts go last, ties keep the manifest order
+
+    '''
+    with __lock:
+        def key(url):
+            stats = __stats(url)
+            if stats.is_demoted():
+                return (2, 0.0)
+            if stats.successes == 0:
+                return (0, 0.0)
+            return (1, stats.estimate(size))
+        return sorted(urls, key=key)
+
+def report_success(url : str, seconds : float, size : int):
+    global __dirty
+    with __lock:
+        __dirty = True
+        stats = __stats(url)
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        if size < __SMALL_FILE:
+            stats.latency = __ewma(stats.latency, seconds)
+        else:
+            latency = stats.latency if stats.latency is not None else 0.0
+            stats.throughput = __ewma(stats.throughput, size / max(seconds - latency, 1e-3))
+
+def report_slow(url : str, seconds : float, size : int):
+    '''
+
+    A fetch from url was still running after seconds and lost a hedge race,
+    its real speed is at best size / seconds
+
+    '''
+    global __dirty
+    with __lock:
+        __dirty = True
+        # only its speed is known, the fetch itself never finished
+        stats = __stats(url)
+        if size > 0:
+            stats.throughput = __ewma(stats.throughput, size / max(seconds, 1e-3))
+
+def report_failure(url : str):
+    global __dirty
+    with __lock:
+        __dirty = True
+        stats = __stats(url)
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= constants.MIRROR_DEMOTE_AFTER:
+            stats.demoted_until = time.monotonic() + constants.MIRROR_DEMOTE_SECONDS
+
+def hedge_delay(url : str, size : int) -> float|None:
+    '''
+
+    returns after how many seconds a fetch from url should be hedged against
+    another mirror, None if hedging is disabled
+
+    '''
+    if constants.MIRROR_HEDGE_FACTOR is None:
+        return None
+    with __lock:
+        estimate = __stats(url).estimate(size)
+    return max(constants.MIRROR_HEDGE_MIN_DELAY, estimate * constants.MIRROR_HEDGE_FACTOR)
+
+def estimate(url : str, size : int) -> float:
+    '''
+
+    returns the seconds a single fetch of size bytes from url is expected to take
+
+    '''
+    with __lock:
+        return __stats(url).estimate(size)
+
+def is_measured(url : str) -> bool:
+    '''
+
+    returns False if estimate falls back to the defaults for url's host
+
+    '''
+    with __lock:
+        return __stats(url).is_measured()
+
+def get_stats() -> List[dict]:
+    with __lock:
+        return [stats.to_dict() for stats in __load().values()]
+
+def save():
+    global __dirty
+    with __lock:
+        if not __dirty or __hosts is None:
+            return
+        os.makedirs(os.path.dirname(STATS_PATH), exist_ok=True)
+        tmp_path = STATS_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({host: {field: getattr(stats, field) for field in __SAVED_FIELDS} for host, stats in __hosts.items()}, f)
+        os.replace(tmp_path, STATS_PATH)
+        __dirty = False
+
+def reset():
+    '''
+
+    Forgets every measurement, the saved ones are not loaded again
+
+    '''
+    global __hosts, __dirty
+    with __lock:
+        __hosts = {}
+        __dirty = False
@@ -0,0 +1,89 @@
+'''
+
+    Decides in which order the files of a download_files batch are fetched
+
+    Files are grouped by priority class. Inside a class the large files
+    are started first, alternating with small ones so the remaining workers
+    keep the pipe full, and a file is only dispatched while its host is
+    below its connection limit.
+
+'''
+
+from collections import Counter, deque
+from typing import List
+from urllib.parse import urlsplit
+from .. import constants
+from ..data_structures import File, Priority
+from . import mirrors
+
+def host_limit(host : str) -> int:
+    return constants.HOST_CONNECTION_LIMITS.get(host, constants.MAX_CONNECTIONS_PER_HOST)
+
+def priority_for(path : str, optional : bool = False) -> Priority:
+    '''
+
+    returns the priority class of a pack file at path (relative to the instance)
+
+    '''
+    # resource and shader packs aren't needed to start the game
+    if optional or path.strip("./").split("/")[0] in constants.SCHEDULER_OPTIONAL_FOLDERS:
+        return Priority.OPTIONAL
+    return Priority.REQUIRED
+
+def plan(files : List[File]) -> List[File]:
+    '''
+
+    returns files in the order they will be dispatched if no host is saturated
+
+    '''
+    ordered = []
+    for priority in sorted({file.priority for file in files}):
+        group = sorted((file for file in files if file.priority == priority), key=lambda file: file.size, reverse=True)
+
+        large = [file for file in group if file.size >= constants.SCHEDULER_LARGE_FILE]
+        small = group[len(large):]
+
+        # large, small, large, small, ... until every large file is running, then the rest of the small ones
+        for i, file in enumerate(large):
+            ordered.append(file)
+            if i < len(small):
+                ordered.append(small[i])
+        ordered += small[len(large):]
+
+    return ordered
+
+class Scheduler():
+
+    def __init__(self, files : List[File]):
+        # host -> files of that host in plan order, tagged with their position in the plan
+        self.queues : dict[str, deque] = {}
+        for index, file in enumerate(plan(files)):
+            host = urlsplit(mirrors.rank(file.urls, file.size)[0]).netloc
+            self.queues.setdefault(host, deque()).append((index, file))
+        self.in_flight : Counter = Counter()
+        self.hosts : dict[int, str] = {}
+
+    def has_pending(self) -> bool:
+        return any(self.queues.values())
+
+    def next(self) -> File|None:
+        '''
+
+        returns the earliest planned file whose host has a free connection, None if every host is busy
+
+        '''
+        best = None
+        for host, queue in self.queues.items():
+            if queue and self.in_flight[host] < host_limit(host):
+                if best is None or queue[0][0] < self.queues[best][0][0]:
+                    best = host
+        if best is None:
+            return None
+
+        _, file = self.queues[best].popleft()
+        self.in_flight[best] += 1
+        self.hosts[id(file)] = best
+        return file
+
+    def done(self, file : File):
+        self.in_flight[self.hosts.pop(id(file))] -= 1
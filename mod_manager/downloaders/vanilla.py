@@ -3,10 +3,14 @@ import json
 import sys
 from hashlib import sha1
 import zipfile
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from .. import utils
 from .. import constants
+from .. import tracing
+from .. import rules
 from .file_downloader import download_file, download_files
-from ..data_structures import File
+from ..data_structures import File, Priority
 
 def __find_version(version, manifest_versions):
     for v in manifest_versions:
@@ -17,23 +21,28 @@ def __find_version(version, manifest_versions):
 def download(version: str):
     download_from_manifest(version)
 
-def download_from_manifest(version: str):
+def get_manifest(version: str) -> dict:
     # download the manifest if it doesnt exist
     manifest_path = os.path.join(constants.META_PATH, "minecraft", version + ".json")
     if not os.path.exists(manifest_path):
         __download_manifest(version)
-    
+
     with open(manifest_path, "r") as f:
-        local_manifest = json.load(f)
-    
-    if "libraries" in local_manifest:
-        download_libraries(local_manifest, version)
+        return json.load(f)
 
-    if "assetIndex" in local_manifest:
-        __download_assets(local_manifest)
+def download_from_manifest(version: str):
+    with tracing.span("version", version=version):
+        with tracing.span("manifest"):
+            local_manifest = get_manifest(version)
 
-    if "downloads" in local_manifest:
-        __download_client(local_manifest)
+        if "libraries" in local_manifest:
+            download_libraries(local_manifest, version)
+
+        if "assetIndex" in local_manifest:
+            __download_assets(local_manifest)
+
+        if "downloads" in local_manifest:
+            __download_client(local_manifest)
 
     if "inheritsFrom" in local_manifest:
         download_from_manifest(local_manifest["inheritsFrom"])
@@ -48,9 +57,14 @@ def __download_manifest(version : str):
     os.makedirs(os.path.join(constants.META_PATH, "minecraft"), exist_ok=True)
     manifest_path = os.path.join(constants.META_PATH, "minecraft", version + ".json")
     if not os.path.exists(manifest_path):
-        download_file(File(version_url, manifest_path))
+        download_file(File(version_url, manifest_path, version_manifest_version.get("sha1")))
 
-def download_libraries(manifest : dict, version):
+def get_library_files(manifest : dict) -> Tuple[List[File], List[str]]:
+    '''
+
+    returns Tuple (library files allowed on this host, List of Tuples (natives jar, extract exclude list))
+
+    '''
 
     files_to_download = []
 
@@ -59,75 +73,96 @@ def download_libraries(manifest : dict, version):
     natives_arch = "64" if sys.maxsize > 2**32 else "32" 
 
     for lib in manifest["libraries"]:
-        if "rules" in lib:
-            do_download = False
-
-            for rule in lib["rules"]:
-                if "os" in rule:
-                    if "version" in rule["os"]:
-                        pass
-                    else:
-
-                        if rule["action"] == "allow":
-                            action = True
-                        elif rule["action"] == "disallow":
-                            action = False
-                        else:
-                            raise ValueError("Unknown action '" + rule["action"] + "'")
-
-                        if rule["os"]["name"] == utils.get_sys_platform():
-                            do_download = action
-                            
-                else:
-                    if rule["action"] == "allow":
-                        do_download = True
-                    elif rule["action"] == "disallow":
-                        do_download = False
-                    else:
-                        raise ValueError("Unknown action '" + rule["action"] + "'")
-        
-            if not do_download:
-                continue
+        if not rules.allows(lib.get("rules")):
+            continue
         
         if "artifact" in lib["downloads"]:
             if lib["downloads"]["artifact"]["url"] != "":
                 files_to_download.append(File(  lib["downloads"]["artifact"]["url"], 
                                             os.path.join(constants.LIB_PATH, lib["downloads"]["artifact"]["path"]),
                                             lib["downloads"]["artifact"]["sha1"],
-                                            lib["downloads"]["artifact"]["size"]  ))
+                                            lib["downloads"]["artifact"]["size"],
+                                            Priority.LAUNCH  ))
         
         if "natives" in lib:
             if utils.get_sys_platform() in lib["natives"]:
                 natives_name = lib["natives"][utils.get_sys_platform()]
                 if lib["downloads"]["classifiers"][natives_name]["url"] != "":
-                    natives.append(os.path.join(constants.LIB_PATH, lib["downloads"]["classifiers"][natives_name]["path"].replace("${arch}", natives_arch)))
-                    files_to_download.append(File(  lib["downloads"]["classifiers"][natives_name]["url"].replace("${arch}", natives_arch), 
-                                                os.path.join(constants.LIB_PATH, lib["downloads"]["classifiers"][natives_name]["path"].replace("${arch}", natives_arch)),
-                                                lib["downloads"]["classifiers"][natives_name]["sha1"],
-                                                lib["downloads"]["classifiers"][natives_name]["size"]  ))
+                    native = File(  lib["downloads"]["classifiers"][natives_name]["url"].replace("${arch}", natives_arch), 
+                                    os.path.join(constants.LIB_PATH, lib["downloads"]["classifiers"][natives_name]["path"].replace("${arch}", natives_arch)),
+                                    lib["downloads"]["classifiers"][natives_name]["sha1"],
+                                    lib["downloads"]["classifiers"][natives_name]["size"],
+                                    Priority.LAUNCH  )
+                    natives.append((native, lib.get("extract", {}).get("exclude", ["META-INF/"])))
+                    files_to_download.append(native)
             else:
                 print("No natives found for " + lib["name"] + " on " + utils.get_sys_platform())
 
-    download_files(files_to_download)
+    return files_to_download, natives
+
+def download_libraries(manifest : dict, version):
+    files_to_download, natives = get_library_files(manifest)
+
+    with tracing.span("libraries"):
+        download_files(files_to_download)
     print("\nDownloading Libraries Done")
-    print("unpacking natives")
+    extract_natives(natives, version)
+
+def __extract_native(jar : File, exclude : List[str], natives_path : str):
+    with zipfile.ZipFile(jar.dest) as file:
+        for member in file.namelist():
+            if not any(member.startswith(prefix) for prefix in exclude):
+                file.extract(member, natives_path)
+
+def extract_natives(natives : List[Tuple[File, List[str]]], version : str):
+    '''
+
+    Unpacks the natives jars into the version's natives directory
+
+    A stamp of the extracted jar sha1s and their exclude lists is kept in
+    the directory, jars that are already in it are not extracted again
+
+    '''
+    if len(natives) == 0:
+        return
 
     natives_path = os.path.join(constants.NATIVES_DIR, sha1(version.encode()).hexdigest())
+    stamp_path = os.path.join(natives_path, ".natives_stamp.json")
     os.makedirs(natives_path, exist_ok=True)
 
-    for lib in natives:
-        with zipfile.ZipFile(lib) as file:
-            file.extractall(natives_path)
-    
+    try:
+        with open(stamp_path, "r", encoding="utf-8") as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        stamp = {}
+
+    todo = [(jar, exclude) for jar, exclude in natives if stamp.get(jar.sha1) != exclude and os.path.exists(jar.dest)]
+    if len(todo) == 0:
+        return
+
+    print("unpacking natives")
+
+    with tracing.span("natives") as trace, ThreadPoolExecutor(max_workers=constants.THREAD_POOL_WORKERS) as pool:
+        trace.add(sum(jar.size for jar, _ in todo), len(todo))
+        for _ in pool.map(lambda native: __extract_native(native[0], native[1], natives_path), todo):
+            pass
+
+    for jar, exclude in todo:
+        stamp[jar.sha1] = exclude
+    with open(stamp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+
     print("done unpacking")
 
-                
-        
+def get_asset_files(manifest : dict) -> List[File]:
+    '''
 
-def __download_assets(manifest : dict):
+    returns every object of the manifest's asset index, downloading the index if needed
+
+    '''
     os.makedirs(os.path.join(constants.ASSETS_PATH, "indexes"), exist_ok=True)
     path = os.path.join(constants.ASSETS_PATH, "indexes", manifest["assetIndex"]["url"].split(os.sep)[-1])
-    download_file(File(manifest["assetIndex"]["url"], path))
+    download_file(File(manifest["assetIndex"]["url"], path, manifest["assetIndex"].get("sha1"), manifest["assetIndex"].get("size", 0)))
 
     with open(path, "rb") as f:
         assets_manifest = json.load(f)
@@ -143,17 +178,46 @@ def __download_assets(manifest : dict):
             asset["hash"],
             asset["size"]
         ))
-    
-    download_files(files_to_download)
+
+    return files_to_download
+
+def __download_assets(manifest : dict):
+    with tracing.span("assets"):
+        download_files(get_asset_files(manifest))
     print("\nDownloading Assets Done")
 
 
+def get_client_file(manifest : dict) -> File:
+    file_path = os.path.join(constants.LIB_PATH, "net", "minecraft", "client", manifest["id"] + ".jar")
+    return File(manifest["downloads"]["client"]["url"], file_path, manifest["downloads"]["client"]["sha1"], manifest["downloads"]["client"]["size"], Priority.LAUNCH)
+
+def get_files(version : str) -> List[File]:
+    '''
+
+    returns the libraries, assets and client jars of a version and
+    everything it inherits from
+
+    '''
+    local_manifest = get_manifest(version)
+
+    files = []
+    if "libraries" in local_manifest:
+        files += get_library_files(local_manifest)[0]
+    if "assetIndex" in local_manifest:
+        files += get_asset_files(local_manifest)
+    if "downloads" in local_manifest:
+        files.append(get_client_file(local_manifest))
+    if "inheritsFrom" in local_manifest:
+        files += get_files(local_manifest["inheritsFrom"])
+    return files
+
 def __download_client(manifest : dict):
-    path = os.path.join(constants.LIB_PATH, "net", "minecraft", "client")
-    os.makedirs(path, exist_ok=True)
-    file_path = os.path.join(path, manifest["id"] + ".jar")
+    os.makedirs(os.path.join(constants.LIB_PATH, "net", "minecraft", "client"), exist_ok=True)
     
-    download_file(File(manifest["downloads"]["client"]["url"], file_path, manifest["downloads"]["client"]["sha1"], manifest["downloads"]["client"]["size"]))
+    with tracing.span("client") as trace:
+        success, client, skipped = download_file(get_client_file(manifest))
+        if success and not skipped:
+            trace.add(client.size, 1)
     
     print("Downloading Client Done")
 
@@ -0,0 +1,230 @@
+'''
+
+    In-process event stream for downloads
+
+    Subscribers are called synchronously from the thread that emits the
+    event (usually a download worker), so they should be quick and
+    thread-safe. A Qt UI should forward them through a signal.
+
+    Every download_files call is a batch with its own id, several batches
+    can run at the same time.
+
+'''
+
+import os
+import time
+import shutil
+import itertools
+import threading
+from collections import deque
+from enum import Enum
+from typing import Callable, List
+from urllib.parse import urlsplit
+from . import constants, utils
+from .data_structures import Colors, File
+
+class EventType(Enum):
+    BATCH_STARTED = "batch_started"
+    BATCH_FINISHED = "batch_finished"
+    FILE_STARTED = "file_started"
+    FILE_PROGRESS = "file_progress"
+    FILE_FINISHED = "file_finished"
+    FILE_SKIPPED = "file_skipped"
+    FILE_FAILED = "file_failed"
+
+class Event():
+
+    def __init__(self, event_type : EventType, file : File|None = None, url : str|None = None, nbytes : int = 0, files : List[File]|None = None, batch : int|None = None):
+        self.type = event_type
+        self.file = file
+        self.url = url
+        # newly transferred bytes for FILE_PROGRESS, the file size for FILE_FINISHED / FILE_SKIPPED
+        self.bytes = nbytes
+        # the whole batch for BATCH_STARTED
+        self.files = files
+        self.batch = batch
+        self.time = time.monotonic()
+
+    @property
+    def host(self) -> str|None:
+        return urlsplit(self.url).netloc if self.url else None
+
+__subscribers : List[Callable[[Event], None]] = []
+__lock = threading.Lock()
+__batch_ids = itertools.count(1)
+
+def new_batch() -> int:
+    with __lock:
+        return next(__batch_ids)
+
+def subscribe(callback : Callable[[Event], None]) -> Callable[[Event], None]:
+    global __subscribers
+    with __lock:
+        # copy on write so emit never has to lock
+        __subscribers = __subscribers + [callback]
+    return callback
+
+def unsubscribe(callback : Callable[[Event], None]):
+    global __subscribers
+    with __lock:
+        __subscribers = [s for s in __subscribers if s is not callback]
+
+def emit(event_type : EventType, file : File|None = None, url : str|None = None, nbytes : int = 0, files : List[File]|None = None, batch : int|None = None):
+    subscribers = __subscribers
+    if not subscribers:
+        return
+    event = Event(event_type, file, url, nbytes, files, batch)
+    for callback in subscribers:
+        callback(event)
+
+class HostStats():
+
+    def __init__(self):
+        self.bytes = 0
+        self.files = 0
+        self.failures = 0
+
+class ProgressStats():
+    '''
+
+    Subscriber aggregating batches into totals, rolling throughput, eta and per-host counters
+
+    With a batch id only that batch is counted, otherwise every batch
+    running at the same time adds to the totals and they start over once
+    none is left
+
+    '''
+
+    def __init__(self, window : float = 5.0, batch : int|None = None):
+        self.window = window
+        self.batch = batch
+        self.active : set[int|None] = set()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, files : List[File]|None = None):
+        self.total_bytes = sum(file.size for file in files) if files else 0
+        self.total_files = len(files) if files else 0
+        self.done_bytes = 0
+        self.done_files = 0
+        self.failed_files = 0
+        self.skipped_files = 0
+        self.transferred = 0
+        self.started = time.monotonic()
+        self.samples : deque = deque()
+        self.hosts : dict[str, HostStats] = {}
+
+    def __call__(self, event : Event):
+        if self.batch is not None and event.batch != self.batch:
+            return
+        with self.lock:
+            match event.type:
+                case EventType.BATCH_STARTED:
+                    if not self.active:
+                        self.reset(event.files)
+                    elif event.files:
+                        self.total_bytes += sum(file.size for file in event.files)
+                        self.total_files += len(event.files)
+                    self.active.add(event.batch)
+                case EventType.BATCH_FINISHED:
+                    self.active.discard(event.batch)
+                case EventType.FILE_PROGRESS:
+                    self.transferred += event.bytes
+                    self.samples.append((event.time, event.bytes))
+                    self.__host(event.host).bytes += event.bytes
+                case EventType.FILE_FINISHED | EventType.FILE_SKIPPED:
+                    self.done_files += 1
+                    self.done_bytes += event.bytes
+                    if event.type == EventType.FILE_SKIPPED:
+                        self.skipped_files += 1
+                    else:
+                        self.__host(event.host).files += 1
+                case EventType.FILE_FAILED:
+                    self.done_files += 1
+                    self.failed_files += 1
+                    self.total_bytes -= event.file.size if event.file else 0
+                    self.__host(event.host).failures += 1
+
+    def __host(self, host : str|None) -> HostStats:
+        host = host or ""
+        if host not in self.hosts:
+            self.hosts[host] = HostStats()
+        return self.hosts[host]
+
+    @property
+    def progress(self) -> float:
+        if self.total_bytes <= 0:
+            return 1.0 if self.done_files >= self.total_files else 0.0
+        return min(self.done_bytes / self.total_bytes, 1.0)
+
+    @property
+    def throughput(self) -> float:
+        '''
+
+        bytes per second over the last window seconds
+
+        '''
+        with self.lock:
+            now = time.monotonic()
+            while self.samples and self.samples[0][0] < now - self.window:
+                self.samples.popleft()
+            span = min(self.window, now - self.started)
+            return sum(nbytes for _, nbytes in self.samples) / max(span, 1e-3)
+
+    @property
+    def eta(self) -> float|None:
+        throughput = self.throughput
+        if throughput <= 0:
+            return None
+        return max(self.total_bytes - self.done_bytes, 0) / throughput
+
+class TerminalRenderer():
+    '''
+
+    Subscriber drawing a progress bar for batch (every batch if None),
+    at most once every PROGRESS_RENDER_INTERVAL seconds
+
+    '''
+
+    def __init__(self, batch : int|None = None):
+        self.batch = batch
+        self.stats = ProgressStats(batch=batch)
+        self.last_render = 0.0
+        self.columns = shutil.get_terminal_size().columns
+        self.last_text = ""
+        self.lock = threading.Lock()
+
+    def __call__(self, event : Event):
+        if self.batch is not None and event.batch != self.batch:
+            return
+        self.stats(event)
+
+        match event.type:
+            case EventType.FILE_FAILED:
+                self.last_text = os.path.basename(event.file.dest) + Colors.RED + " ERROR" + Colors.END
+            case EventType.FILE_FINISHED:
+                self.last_text = os.path.basename(event.file.dest) + Colors.GREEN + " OK" + Colors.END
+            case EventType.FILE_SKIPPED:
+                self.last_text = os.path.basename(event.file.dest) + Colors.GREEN + " SKIPPING" + Colors.END
+            case EventType.BATCH_STARTED:
+                self.columns = shutil.get_terminal_size().columns
+                return
+            case EventType.BATCH_FINISHED:
+                self.render(force=True)
+                return
+
+        self.render(force=event.type == EventType.FILE_FAILED)
+
+    def render(self, force : bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_render < constants.PROGRESS_RENDER_INTERVAL:
+            return
+        if not self.lock.acquire(blocking=force):
+            return
+        try:
+            self.last_render = now
+            eta = self.stats.eta
+            text = self.last_text + f" {self.stats.throughput / 1024 / 1024:.1f} MiB/s" + (f" eta {eta:.0f}s" if eta is not None else "")
+            utils.print_with_progress(text, self.stats.progress, columns=self.columns)
+        finally:
+            self.lock.release()
@@ -0,0 +1,121 @@
+'''
+
+    Persistent index of files whose sha1 has already been verified
+
+    An entry is only trusted as long as the file's size, mtime and inode
+    are unchanged, otherwise the caller has to hash the file again
+
+'''
+
+import os
+import json
+import atexit
+import hashlib
+import threading
+from . import constants
+
+INDEX_PATH = os.path.join(constants.META_PATH, "verified_files.json")
+
+# path -> [size, mtime_ns, inode, sha1]
+__entries : dict[str, list]|None = None
+__dirty = False
+__lock = threading.RLock()
+
+def __stat_key(path : str) -> list|None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+def __load() -> dict[str, list]:
+    global __entries
+    if __entries is None:
+        try:
+            with open(INDEX_PATH, "r", encoding="utf-8") as f:
+                __entries = json.load(f)
+        except (OSError, ValueError):
+            __entries = {}
+    return __entries
+
+def is_verified(path : str, sha1 : str) -> bool:
+    '''
+
+    returns True if path was verified to have sha1 and hasn't changed since
+
+    '''
+    with __lock:
+        entry = __load().get(os.path.abspath(path))
+    if entry is None or entry[3] != sha1:
+        return False
+    return entry[:3] == __stat_key(path)
+
+def record(path : str, sha1 : str):
+    global __dirty
+    key = __stat_key(path)
+    if key is None:
+        return
+    with __lock:
+        __load()[os.path.abspath(path)] = key + [sha1]
+        __dirty = True
+
+def check(path : str, sha1 : str) -> bool:
+    '''
+
+    Checks path against sha1, only hashing the file if the index can't vouch for it
+
+    returns True if the file exists and matches
+
+    '''
+    if is_verified(path, sha1):
+        return True
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        if hashlib.file_digest(f, "sha1").hexdigest() != sha1:
+            return False
+    record(path, sha1)
+    return True
+
+def invalidate(path : str|None = None):
+    '''
+
+    Forgets path, or every entry if no path is given
+
+    '''
+    global __entries, __dirty
+    with __lock:
+        if path is None:
+            __entries = {}
+        else:
+            __load().pop(os.path.abspath(path), None)
+        __dirty = True
+
+def rebuild():
+    '''
+
+    Re-hashes every indexed file and drops the ones that are missing or changed
+
+    '''
+    global __entries, __dirty
+    with __lock:
+        entries = dict(__load())
+        __entries = {}
+        __dirty = True
+    for path, entry in entries.items():
+        check(path, entry[3])
+    save()
+
+def save():
+    global __dirty
+    with __lock:
+        if not __dirty or __entries is None:
+            return
+        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+        tmp_path = INDEX_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(__entries, f)
+        os.replace(tmp_path, INDEX_PATH)
+        __dirty = False
+
+atexit.register(save)
@@ -0,0 +1,56 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import constants
+
+__session : requests.Session|None = None
+__session_pid : int|None = None
+__session_lock = threading.Lock()
+
+def __create_session() -> requests.Session:
+    retries = Retry(
+        total=constants.HTTP_RETRIES,
+        backoff_factor=constants.HTTP_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+
+    # one pool per host, each big enough for every download worker to keep its connection alive
+    adapter = HTTPAdapter(
+        pool_connections=constants.HTTP_POOL_HOSTS,
+        pool_maxsize=constants.HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "Modmanager"
+    return session
+
+def get_session() -> requests.Session:
+    '''
+
+    returns the keep-alive session shared by every fetch in this process
+
+    '''
+    global __session, __session_pid
+
+    # sockets must not be shared with forked workers, they get their own session
+    if __session is None or __session_pid != os.getpid():
+        with __session_lock:
+            if __session is None or __session_pid != os.getpid():
+                __session = __create_session()
+                __session_pid = os.getpid()
+    return __session
+
+def close_session():
+    global __session, __session_pid
+    with __session_lock:
+        if __session is not None:
+            __session.close()
+        __session = None
+        __session_pid = None
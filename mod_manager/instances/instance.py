@@ -1,4 +1,6 @@
 import os
+import time
+import shutil
 from platform import release
 from typing import List, Literal, Tuple
 from uuid import uuid4
@@ -7,12 +9,17 @@ import subprocess
 import re
 from hashlib import sha1
 from slugify import slugify
-from .. import constants
-from ..downloaders import vanilla
-from ..downloaders.loaders import forge
+from .. import constants, tracing, rules
 from .. import utils
-from ..data_structures import MCVersion, MPVersion, Platform, ModLoader
-from ..downloaders import ftb, curseforge
+from ..data_structures import MCVersion, MPVersion, Platform, ModLoader, UpdatePolicy, InstallState
+from . import updater, instance_index
+
+# the downloaders (and requests with them) are only imported by the methods
+# that install, so loading an instance and launching it stays cheap
+
+# bump when the layout of launch_plan.json changes
+LAUNCH_PLAN_VERSION = 2
+ARG_VAR_PATTERN = re.compile(r"\$\{(\w+)\}")
 
 class Instance():
 
@@ -41,13 +48,20 @@ class Instance():
     
     @staticmethod
     def load(name : str):
+        entry = instance_index.get(name)
+        if entry is not None and os.path.exists(entry["directory"]):
+            return Instance(entry)
+
+        # not indexed yet, e.g. copied in by hand
         directory = os.path.join(constants.INSTANCES_PATH, slugify(name))
         if not os.path.exists(directory): return None
         with open(os.path.join(directory, "instance.json"), "r", encoding="utf-8") as f:
-            return Instance(json.load(f))
+            instance = Instance(json.load(f))
+        instance_index.update(instance)
+        return instance
     
     @staticmethod
-    def create_instance(name: str, mc_version: MCVersion, mp_version: MPVersion, platform: Platform, load_if_possible:bool = True):
+    def create_instance(name: str, mc_version: MCVersion, mp_version: MPVersion, platform: Platform, load_if_possible:bool = True, initialize:bool = True):
         if load_if_possible:
             try:
                 loaded_instance = Instance.load(name)
@@ -66,7 +80,8 @@ class Instance():
             "directory":  directory
         })
 
-        new_instance.initialize()
+        if initialize:
+            new_instance.initialize()
 
         return new_instance
     
@@ -75,27 +90,53 @@ class Instance():
         with open(os.path.join(self.directory, "instance.json"), "w", encoding="utf-8") as f:
             f.truncate()
             json.dump(self.to_dict(), f)
-            
+        instance_index.update(self)
+
+    def delete(self):
+        '''
+
+        Removes the instance directory and its index entry, shared libraries,
+        assets and store objects stay
+
+        '''
+        shutil.rmtree(self.directory, ignore_errors=True)
+        instance_index.remove(os.path.basename(os.path.normpath(self.directory)))
 
     def initialize(self):
         print("init start")
 
-        os.makedirs(self.directory, exist_ok=True)
-        os.makedirs(os.path.join(self.directory, "minecraft"), exist_ok=True)
+        with tracing.span("initialize", instance=self.mp_name):
+            constants.ensure_directories()
+            os.makedirs(self.directory, exist_ok=True)
+            os.makedirs(os.path.join(self.directory, "minecraft"), exist_ok=True)
+            instance_index.update(self, state=InstallState.INSTALLING.value)
+
+            try:
+                self.__install()
+            except BaseException as e:
+                instance_index.update(self, state=InstallState.FAILED.value)
+                raise e
+
+            instance_index.update(self, state=InstallState.INSTALLED.value, size=instance_index.disk_usage(self.directory))
+        print("initialized " + self.mp_name)
+
+    def __install(self):
+        from ..downloaders import ftb, curseforge
 
         # Download Pack files
 
         print("pack download start")
-        match self.platform:
-            case Platform.FEEDTHEBEAST:
-                ftb.download(self.mp_version, os.path.join(self.directory, "minecraft"))
-            case Platform.CURSEFORGE:
-                curseforge.download(self.mp_version, os.path.join(self.directory, "minecraft"))
-                pass
-            case Platform.MODRINTH:
-                pass
-            case Platform.CUSTOM:
-                pass
+        with tracing.span("pack", platform=str(self.platform)):
+            match self.platform:
+                case Platform.FEEDTHEBEAST:
+                    ftb.download(self.mp_version, os.path.join(self.directory, "minecraft"))
+                case Platform.CURSEFORGE:
+                    curseforge.download(self.mp_version, os.path.join(self.directory, "minecraft"))
+                    pass
+                case Platform.MODRINTH:
+                    pass
+                case Platform.CUSTOM:
+                    pass
         
         print("Mod Download Done")
         
@@ -105,37 +146,129 @@ class Instance():
 
         # Download ModLoader
         
+        with tracing.span("loader", loader=str(self.mc_version.loader)):
+            self.__install_loader()
+
+        self.save()
+        try:
+            with tracing.span("launch_plan"):
+                self.build_launch_plan()
+        except (OSError, ValueError) as e:
+            print("launch plan not built, it will be built on launch: " + str(e))
+    
+    def __install_loader(self):
+        from ..downloaders.loaders import forge
+
         match self.mc_version.loader:
             case ModLoader.FORGE:
                 forge.download(self.mc_version.loader_version, self.mc_version.mc_version)
             case ModLoader.FABRIC:
                 pass
 
+    def update(self, version_id : str, policy : UpdatePolicy = UpdatePolicy.KEEP_MODIFIED) -> updater.PackDiff:
+        '''
+
+        Moves the instance to another version of its pack, only fetching files
+        that were added or changed and deleting the ones that were removed.
+        The loader is only reinstalled if the pack targets changed.
+
+        '''
+        from ..downloaders import ftb, curseforge
+
+        match self.platform:
+            case Platform.FEEDTHEBEAST:
+                pack = ftb
+            case Platform.CURSEFORGE:
+                pack = curseforge
+            case _:
+                raise ValueError("Updates are not supported for " + self.platform.display_name)
+
+        directory = os.path.join(self.directory, "minecraft")
+
+        old_manifest = pack.get_version_manifest(self.mp_version)
+        new_mp_version = MPVersion("", self.mp_version.modpack_id, str(version_id))
+        new_manifest = pack.get_version_manifest(new_mp_version)
+        new_mp_version.version_name = new_manifest["name"]
+
+        old_files = pack.get_files(old_manifest, directory)
+        diff = updater.diff_files(old_files, pack.get_files(new_manifest, directory))
+        to_fetch, to_delete = updater.apply_policy(diff, old_files, directory, policy)
+
+        print(f"update {self.mp_version.version_name} -> {new_mp_version.version_name}: {diff.to_dict()}")
+
+        # removed files stay and the instance keeps its old version until every new file
+        # is in place, a failed update can simply be run again
+        failed = pack.install_files(to_fetch)
+        if failed:
+            raise RuntimeError(f"update to {new_mp_version.version_name} failed, {len(failed)} files could not be downloaded: "
+                               + ", ".join(os.path.basename(file.dest) for file in failed))
+
+        for file in to_delete:
+            os.remove(file.dest)
+
+        # the overrides zip only comes along if it changed
+        extract_dests = {os.path.join(directory, f["path"], f["name"]) for f in new_manifest["files"] if f["type"] == "cf-extract"}
+        if pack is curseforge and any(file.dest in extract_dests for file in to_fetch):
+            from .. import mod_store
+
+            # the previous zip is still in the store, it tells which override files the user changed
+            previous = [f["sha1"] for f in old_manifest["files"] if f["type"] == "cf-extract" and f.get("sha1")]
+            curseforge.extract_overrides(new_manifest, directory, overwrite=policy == UpdatePolicy.OVERWRITE,
+                                         previous=mod_store.store_path(previous[-1]) if previous else None)
+
+        self.mp_version = new_mp_version
+
+        new_mc_version = MCVersion.from_targets(new_manifest["targets"])
+        if new_mc_version.to_dict() != self.mc_version.to_dict():
+            self.mc_version = new_mc_version
+            self.__install_loader()
+
         self.save()
-        print("initialized " + self.mp_name)
-    
-    def launch(self):
-        # load args
+        self.build_launch_plan()
+
+        return diff
+
+    def verify(self, repair : bool = False, policy : UpdatePolicy = UpdatePolicy.KEEP_MODIFIED) -> "verifier.VerifyReport":
+        '''
+
+        Hashes every file the pack, libraries and assets expect, with repair
+        the missing and corrupt ones are downloaded again. Configs the user
+        changed are only reported, unless policy overwrites them
+
+        '''
+        from . import verifier
+        return verifier.verify(self, repair, policy)
+
+    def build_launch_plan(self) -> dict:
+        '''
 
-        jvm_args, game_args, libs, main_class, client_id, asset_id = self.__load_manifest()
+        Resolves the manifest chain into everything launch needs that doesn't
+        change between launches and stores it next to instance.json
 
-        jvm_args = self.__parse_arg_rules(jvm_args)
-        game_args = self.__parse_arg_rules(game_args)
+        '''
+        sources = []
+        jvm_args, game_args, libs, main_class, client_id, asset_id = self.__load_manifest(sources=sources)
+
+        jvm_args = rules.filter_arguments(jvm_args)
+        game_args = rules.filter_arguments(game_args)
 
         classpath = [os.path.join(constants.LIB_PATH, "net", "minecraft", "client", client_id + ".jar")]
+        missing = []
         for lib in libs:
+            if not rules.allows(lib.get("rules")):
+                continue
+            paths = []
             if "artifact" in lib["downloads"]:
-                path = os.path.join(constants.LIB_PATH, lib["downloads"]["artifact"]["path"])
-                if os.path.exists(path):
-                    classpath.append(path)
+                paths.append(os.path.join(constants.LIB_PATH, lib["downloads"]["artifact"]["path"]))
             if "natives" in lib:
                 if utils.get_sys_platform() in lib["natives"]:
                     natives_name = lib["natives"][utils.get_sys_platform()]
-                    path = os.path.join(constants.LIB_PATH, lib["downloads"]["classifiers"][natives_name]["path"])
-                    if os.path.exists(path):
-                        classpath.append(path)
-        
-        classpath = utils.get_cp_sep().join(classpath)
+                    paths.append(os.path.join(constants.LIB_PATH, lib["downloads"]["classifiers"][natives_name]["path"]))
+            for path in paths:
+                if os.path.exists(path):
+                    classpath.append(path)
+                else:
+                    missing.append(path)
 
         if len(jvm_args) == 0:
             jvm_args = "-XX:+UseG1GC -Dsun.rmi.dgc.server.gcInterval=2147483646 -XX:+UnlockExperimentalVMOptions -XX:G1NewSizePercent=20 -XX:G1ReservePercent=20 -XX:MaxGCPauseMillis=51 -XX:G1HeapRegionSize=32M".split(" ")
@@ -149,18 +282,65 @@ class Instance():
                 "-Xss1M"
             ]
 
+        plan = {
+            "version": LAUNCH_PLAN_VERSION,
+            "sources": [[path] + self.__stat_key(path) for path in sources],
+            "jvm_args": jvm_args,
+            "game_args": game_args,
+            "main_class": main_class,
+            "classpath": classpath,
+            "missing": missing,
+            "client_id": client_id,
+            "asset_id": asset_id,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        plan_path = os.path.join(self.directory, "launch_plan.json")
+        with open(plan_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(plan, f)
+        os.replace(plan_path + ".tmp", plan_path)
+
+        return plan
+
+    def __stat_key(self, path : str) -> List[int]:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def __load_launch_plan(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, "launch_plan.json"), "r", encoding="utf-8") as f:
+                plan = json.load(f)
+            # the plan is only valid as long as none of the manifests it was built from changed
+            # and no library that was missing back then showed up since
+            if plan["version"] == LAUNCH_PLAN_VERSION \
+                    and all(self.__stat_key(path) == [size, mtime] for path, size, mtime in plan["sources"]) \
+                    and not any(os.path.exists(path) for path in plan["missing"]):
+                return plan
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.build_launch_plan()
+
+    def prepare_launch(self) -> List[str]:
+        '''
+
+        returns the java command line for this instance
+
+        '''
+        plan = self.__load_launch_plan()
+        client_id = plan["client_id"]
+
         arg_vars = {
             "natives_directory": os.path.join(constants.NATIVES_DIR, sha1(client_id.encode()).hexdigest()),
             "launcher_name": "Modmanager",
             "launcher_version": "release",
-            "classpath": classpath,
+            "classpath": utils.get_cp_sep().join(plan["classpath"]),
             "version_name": client_id,
             "library_directory": constants.LIB_PATH,
             "classpath_separator": utils.get_cp_sep(),
             "auth_player_name": "JoBlock",
             "game_directory": os.path.join(self.directory, "minecraft"),
             "assets_root": constants.ASSETS_PATH,
-            "assets_index_name": asset_id,
+            "assets_index_name": plan["asset_id"],
             "auth_uuid": uuid4(),
             "auth_access_token": "none",
             "clientid": client_id,
@@ -169,79 +349,52 @@ class Instance():
             "version_type": "release"
         }
 
-        jvm_args = self.__parse_arg_vars(jvm_args, arg_vars)
-        game_args = self.__parse_arg_vars(game_args, arg_vars)
+        jvm_args = self.__parse_arg_vars(plan["jvm_args"], arg_vars)
+        game_args = self.__parse_arg_vars(plan["game_args"], arg_vars)
 
-        #print(jvm_args)
-        #print(game_args)
+        return ["java"] + jvm_args + [plan["main_class"]] + game_args
 
-        subprocess.run(["java"] + jvm_args + [main_class] + game_args, cwd=os.path.join(self.directory, "minecraft"), check=False)
+    def launch(self):
+        with tracing.span("launch", instance=self.mp_name):
+            with tracing.span("prepare"):
+                command = self.prepare_launch()
+        instance_index.update(self, last_launched=time.time())
+        subprocess.run(command, cwd=os.path.join(self.directory, "minecraft"), check=False)
     
     def __parse_arg_vars(self, args, variables):
-        retval = []
-        for arg in args:
-            new_arg:str = arg
-            for key, val in variables.items():
-
-                placeholder = f"${{{key}}}"
-                new_arg = new_arg.replace(placeholder, str(val))
-            
-            retval.append(new_arg)
-        
-        return retval
+        def replace(match):
+            if match.group(1) in variables:
+                return str(variables[match.group(1)])
+            return match.group(0)
 
+        return [ARG_VAR_PATTERN.sub(replace, arg) for arg in args]
 
-    def __parse_arg_rules(self, args : List) -> List[str]:
-        new_args = []
+    def get_version_name(self) -> str:
+        '''
 
-        for arg in args:
-            if not isinstance(arg, dict):
-                new_args.append(arg)
-                continue
+        returns the id of the version json in META_PATH this instance launches
 
-                
-            passed = False
-            for rule in arg["rules"]:
-                if "os" in rule:
-                    ospass = True
-                    if "name" in rule["os"]:
-                        ospass = ospass and (rule["os"]["name"] == utils.get_sys_platform())
-                    
-                    if "version" in rule["os"]:
-                        from platform import uname
-                        ospass = ospass and (re.match(rule["os"]["version"], uname().release))
-                    
-                    if "arch" in rule["os"]:
-                        from platform import machine
-                        ospass = ospass and (machine().lower().startswith(rule["os"]["arch"]))
-                    
-                    passed = ospass
-                
-            if passed:
-                val = arg["value"]
-                if isinstance(val, str):
-                    new_args.append(val)
-                else:
-                    for v in val:
-                        new_args.append(v)
-        
-        return new_args
-    
-    def __load_manifest(self, vname: str|None = None) -> Tuple[List[str], List[str], List[dict], str, str, str]:
+        '''
+        match self.mc_version.loader:
+            case ModLoader.FORGE:
+                return f"{self.mc_version.mc_version}-forge-{self.mc_version.loader_version}"
+            case ModLoader.VANILLA:
+                return self.mc_version.mc_version
+            case _:
+                raise ValueError("Invalid / unsupported loader")
+
+    def __load_manifest(self, vname: str|None = None, sources: List[str]|None = None) -> Tuple[List[str], List[str], List[dict], str, str, str]:
         if vname == None:
-            match self.mc_version.loader:
-                case ModLoader.FORGE:
-                    vname = f"{self.mc_version.mc_version}-forge-{self.mc_version.loader_version}"
-                case ModLoader.VANILLA:
-                    vname = self.mc_version.mc_version
-                case _:
-                    raise ValueError("Invalid / unsupported loader")
+            vname = self.get_version_name()
         jvm_args, game_args, libs, main_class, client_id, asset_id = [], [], [], "", "", ""
 
-        with open(os.path.join(constants.META_PATH, "minecraft", vname + ".json"), "r") as f:
+        manifest_path = os.path.join(constants.META_PATH, "minecraft", vname + ".json")
+        if sources is not None:
+            sources.append(manifest_path)
+        with open(manifest_path, "r") as f:
             version_manifest = json.load(f)
         if "inheritsFrom" in version_manifest:
-            jvm_args, game_args, libs, main_class, client_id, asset_id = self.__load_manifest(version_manifest["inheritsFrom"])
+            jvm_args, game_args, libs, main_class, client_id, asset_id = self.__load_manifest(version_manifest["inheritsFrom"], sources)
         
         if "arguments" in version_manifest:
             jvm_args += version_manifest["arguments"]["jvm"]
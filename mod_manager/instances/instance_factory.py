@@ -1,48 +1,39 @@
+from typing import Tuple
 from mod_manager import utils
 from mod_manager.downloaders import ftb, curseforge, modrinth
 from mod_manager.data_structures import MPVersion, MCVersion, ModLoader, Platform
 from .instance import Instance
 
-def create_ftb(pack_id : str, version_id : str) -> Instance:
+def __get_json(url : str) -> dict:
+    manifest = utils.get_json(url)
+    if "status" in manifest:
+        if manifest["status"] == "error":
+            raise AssertionError(manifest["message"])
+    return manifest
 
-    modpack_manifest = utils.get_json(f"https://api.modpacks.ch/public/modpack/{pack_id}")
-    if "status" in modpack_manifest:
-        if modpack_manifest["status"] == "error":
-            raise AssertionError(modpack_manifest["message"])
-
-    version_manifest = utils.get_json(f"https://api.modpacks.ch/public/modpack/{pack_id}/{version_id}")
-    if "status" in version_manifest:
-        if version_manifest["status"] == "error":
-            raise AssertionError(version_manifest["message"])
-    
-    game_ver, loader_type, loader_ver = "", "", ""
-    for target in version_manifest["targets"]:
-        if target["type"] == "modloader":
-            loader_type = target["name"]
-            loader_ver = target['version']
-        elif target["type"] == "game":
-            game_ver = target["version"]
-
-    return Instance.create_instance(modpack_manifest["name"], MCVersion(game_ver, loader_type, loader_ver), MPVersion(version_manifest["name"], pack_id, version_id), Platform.FEEDTHEBEAST)
+def resolve(platform : Platform, pack_id : str, version_id : str) -> Tuple[str, MCVersion, MPVersion, dict]:
+    '''
 
-def create_curseforge(pack_id : str, version_id : str) -> Instance:
+    returns Tuple (pack name, mc version, pack version, version manifest)
+
+    '''
+    match platform:
+        case Platform.FEEDTHEBEAST:
+            api = "https://api.modpacks.ch/public/modpack"
+        case Platform.CURSEFORGE:
+            api = "https://api.modpacks.ch/public/curseforge"
+        case _:
+            raise ValueError("Packs from " + platform.display_name + " are not supported")
+
+    modpack_manifest = __get_json(f"{api}/{pack_id}")
+    version_manifest = __get_json(f"{api}/{pack_id}/{version_id}")
 
-    modpack_manifest = utils.get_json(f"https://api.modpacks.ch/public/curseforge/{pack_id}")
-    if "status" in modpack_manifest:
-        if modpack_manifest["status"] == "error":
-            raise AssertionError(modpack_manifest["message"])
-
-    version_manifest = utils.get_json(f"https://api.modpacks.ch/public/curseforge/{pack_id}/{version_id}")
-    if "status" in version_manifest:
-        if version_manifest["status"] == "error":
-            raise AssertionError(version_manifest["message"])
-    
-    game_ver, loader_type, loader_ver = "", "", ""
-    for target in version_manifest["targets"]:
-        if target["type"] == "modloader":
-            loader_type = target["name"]
-            loader_ver = target['version']
-        elif target["type"] == "game":
-            game_ver = target["version"]
-
-    return Instance.create_instance(modpack_manifest["name"], MCVersion(game_ver, loader_type, loader_ver), MPVersion(version_manifest["name"], pack_id, version_id), Platform.CURSEFORGE)
\ No newline at end of file
+    return modpack_manifest["name"], MCVersion.from_targets(version_manifest["targets"]), MPVersion(version_manifest["name"], pack_id, version_id), version_manifest
+
+def create_ftb(pack_id : str, version_id : str) -> Instance:
+    name, mc_version, mp_version, _ = resolve(Platform.FEEDTHEBEAST, pack_id, version_id)
+    return Instance.create_instance(name, mc_version, mp_version, Platform.FEEDTHEBEAST)
+
+def create_curseforge(pack_id : str, version_id : str) -> Instance:
+    name, mc_version, mp_version, _ = resolve(Platform.CURSEFORGE, pack_id, version_id)
+    return Instance.create_instance(name, mc_version, mp_version, Platform.CURSEFORGE)
@@ -0,0 +1,146 @@
+'''
+
+    Index of every instance at INSTANCES_INDEX
+
+    Listing or looking up instances reads this one file instead of every
+    instance.json. Entries hold the instance's own data plus its slug,
+    install state, size on disk and when it was last launched.
+
+    The file is rewritten through a temporary file and os.replace, a
+    missing or unreadable index is rebuilt from INSTANCES_PATH. Sizes are
+    left out of that rebuild so lookups on the launch path don't walk every
+    instance folder, rebuild() fills them in.
+
+'''
+
+import os
+import json
+import time
+import threading
+from typing import List
+from slugify import slugify
+from .. import constants
+from ..data_structures import InstallState
+
+INDEX_VERSION = 1
+
+__lock = threading.RLock()
+
+def __read() -> dict|None:
+    try:
+        with open(constants.INSTANCES_INDEX, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return None
+    return data
+
+def __write(data : dict):
+    os.makedirs(os.path.dirname(constants.INSTANCES_INDEX), exist_ok=True)
+    tmp_path = f"{constants.INSTANCES_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, constants.INSTANCES_INDEX)
+
+def __load() -> dict:
+    data = __read()
+    if data is None:
+        data = __scan({}, sizes=False)
+        __write(data)
+    return data
+
+def disk_usage(directory : str) -> int:
+    '''
+
+    returns the bytes of every file below directory, hardlinks counted once
+
+    '''
+    total = 0
+    seen = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
+
+def __scan(previous : dict, sizes : bool = True) -> dict:
+    instances = {}
+    if os.path.isdir(constants.INSTANCES_PATH):
+        for slug in sorted(os.listdir(constants.INSTANCES_PATH)):
+            directory = os.path.join(constants.INSTANCES_PATH, slug)
+            try:
+                with open(os.path.join(directory, "instance.json"), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            old = previous.get(slug, {})
+            installed = os.path.exists(os.path.join(directory, "launch_plan.json"))
+            entry.update({
+                "slug": slug,
+                "state": old.get("state", InstallState.INSTALLED.value if installed else InstallState.CREATED.value),
+                "size": disk_usage(directory) if sizes else old.get("size"),
+                "last_launched": old.get("last_launched"),
+                "updated_at": time.time(),
+            })
+            instances[slug] = entry
+    return {"version": INDEX_VERSION, "instances": instances}
+
+def rebuild() -> List[dict]:
+    '''
+
+    Reads every instance.json in INSTANCES_PATH again, states and launch
+    times already in the index are kept
+
+    '''
+    with __lock:
+        previous = __read()
+        data = __scan(previous["instances"] if previous else {})
+        __write(data)
+    return list(data["instances"].values())
+
+def list_instances() -> List[dict]:
+    with __lock:
+        return list(__load()["instances"].values())
+
+def get(name : str) -> dict|None:
+    '''
+
+    returns the entry of the instance called name (or with that slug)
+
+    '''
+    with __lock:
+        return __load()["instances"].get(slugify(name))
+
+def update(instance, **fields) -> dict:
+    '''
+
+    Stores instance.to_dict() and fields like state, size or last_launched
+
+    returns the new entry
+
+    '''
+    slug = os.path.basename(os.path.normpath(instance.directory))
+    with __lock:
+        data = __load()
+        entry = data["instances"].get(slug, {"state": InstallState.CREATED.value, "size": None, "last_launched": None})
+        entry.update(instance.to_dict())
+        entry.update(fields)
+        entry["slug"] = slug
+        entry["updated_at"] = time.time()
+        data["instances"][slug] = entry
+        __write(data)
+    return entry
+
+def remove(name : str):
+    with __lock:
+        data = __load()
+        if data["instances"].pop(slugify(name), None) is not None:
+            __write(data)
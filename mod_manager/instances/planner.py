@@ -0,0 +1,261 @@
+'''
+
+    Installs several packs with a single download pass
+
+    The manifests of every requested pack are resolved concurrently and
+    merged into one InstallPlan. Files several instances share (game
+    versions, libraries, assets, mods with the same sha1) are downloaded once.
+
+    estimate tells what executing a plan would cost without downloading.
+
+'''
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from urllib.parse import urlsplit
+from .. import constants, file_index, mod_store
+from ..data_structures import Colors, File, ModLoader, Platform, InstallState
+from ..downloaders import ftb, curseforge, vanilla, mirrors, scheduler
+from ..downloaders.loaders import forge
+from ..downloaders.file_downloader import download_files
+from . import instance_factory, instance_index
+from .instance import Instance
+
+class InstallPlan():
+
+    def __init__(self):
+        self.instances : List[Instance] = []
+        # instance directory -> version manifest and pack files pointing into the instance
+        self.manifests : dict[str, dict] = {}
+        self.pack_files : dict[str, List[File]] = {}
+        # game versions to finish after downloading, (forge version, mc version) for forge
+        self.versions : set[str] = set()
+        self.loaders : set[Tuple[str, str]] = set()
+        # what the download pass fetches, one File per destination
+        self.files : List[File] = []
+        self.failed : List[File] = []
+        self.__dests : set[str] = set()
+
+    def add(self, files : List[File]):
+        for file in files:
+            # pack files go through the store, so the same sha1 ends up at the same destination
+            if file.dest not in self.__dests:
+                self.__dests.add(file.dest)
+                self.files.append(file)
+
+def __pack(platform : Platform):
+    match platform:
+        case Platform.FEEDTHEBEAST:
+            return ftb
+        case Platform.CURSEFORGE:
+            return curseforge
+    raise ValueError("Packs from " + platform.display_name + " are not supported")
+
+def __add_instance(install_plan : InstallPlan, instance : Instance, version_manifest : dict|None):
+    if instance.directory in install_plan.manifests:
+        return
+    install_plan.instances.append(instance)
+    install_plan.manifests[instance.directory] = version_manifest
+    if version_manifest is not None:
+        install_plan.pack_files[instance.directory] = __pack(instance.platform).get_files(version_manifest, os.path.join(instance.directory, "minecraft"))
+    else:
+        install_plan.pack_files[instance.directory] = []
+
+    match instance.mc_version.loader:
+        case ModLoader.FORGE:
+            install_plan.loaders.add((instance.mc_version.loader_version, instance.mc_version.mc_version))
+            install_plan.versions.add(instance.get_version_name())
+        case ModLoader.VANILLA:
+            install_plan.versions.add(instance.get_version_name())
+
+def __add_game_files(install_plan : InstallPlan, pool : ThreadPoolExecutor):
+    # the forge version jsons come out of the installers, so they have to be there before walking the versions
+    for files in pool.map(lambda loader: forge.get_files(*loader), install_plan.loaders):
+        install_plan.add(files)
+    for files in pool.map(vanilla.get_files, install_plan.versions):
+        install_plan.add(files)
+
+    for instance in install_plan.instances:
+        install_plan.add(mod_store.to_store(install_plan.pack_files[instance.directory]))
+
+def plan(requests : List[Tuple[Platform, str, str]]) -> InstallPlan:
+    '''
+
+    Resolves every (platform, pack id, version id) in requests without
+    downloading anything but metadata and forge installers
+
+    '''
+    constants.ensure_directories()
+    install_plan = InstallPlan()
+
+    with ThreadPoolExecutor(max_workers=constants.THREAD_POOL_WORKERS) as pool:
+        resolved = list(pool.map(lambda request: instance_factory.resolve(*request), requests))
+
+        for (platform, _, _), (name, mc_version, mp_version, version_manifest) in zip(requests, resolved):
+            instance = Instance.create_instance(name, mc_version, mp_version, platform, load_if_possible=False, initialize=False)
+            __add_instance(install_plan, instance, version_manifest)
+
+        __add_game_files(install_plan, pool)
+
+    return install_plan
+
+def plan_instances(instances : List[Instance]) -> InstallPlan:
+    '''
+
+    Like plan for instances that already exist, custom instances only
+    bring their game version and loader
+
+    '''
+    constants.ensure_directories()
+    install_plan = InstallPlan()
+
+    def version_manifest(instance):
+        if instance.platform in (Platform.FEEDTHEBEAST, Platform.CURSEFORGE):
+            return __pack(instance.platform).get_version_manifest(instance.mp_version)
+        return None
+
+    with ThreadPoolExecutor(max_workers=constants.THREAD_POOL_WORKERS) as pool:
+        for instance, manifest in zip(instances, pool.map(version_manifest, instances)):
+            __add_instance(install_plan, instance, manifest)
+
+        __add_game_files(install_plan, pool)
+
+    return install_plan
+
+class Estimate():
+
+    def __init__(self):
+        self.total_files = 0
+        self.total_bytes = 0
+        self.fetch_files = 0
+        self.fetch_bytes = 0
+        # host -> [files, bytes] still to fetch from it
+        self.hosts : dict[str, List[int]] = {}
+        # hosts no run has measured yet, their share of the eta is a guess
+        self.unmeasured : set[str] = set()
+        self.eta : float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "total_files": self.total_files,
+            "total_bytes": self.total_bytes,
+            "fetch_files": self.fetch_files,
+            "fetch_bytes": self.fetch_bytes,
+            "hosts": self.hosts,
+            "unmeasured": sorted(self.unmeasured),
+            "eta": self.eta,
+        }
+
+    def __str__(self) -> str:
+        lines = [f"{self.total_files} files, {self.total_bytes / 1024 / 1024:.1f} MiB, "
+                 f"{self.fetch_files} files / {self.fetch_bytes / 1024 / 1024:.1f} MiB to fetch, eta {self.eta:.0f}s"]
+        for host, (files, nbytes) in sorted(self.hosts.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {host:<40} {files:6} files {nbytes / 1024 / 1024:9.1f} MiB" + (" (not measured yet, default speed)" if host in self.unmeasured else ""))
+        return "\n".join(lines)
+
+def __is_present(file : File) -> bool:
+    # the index answers without hashing, an unindexed file of the right size is hashed by the download
+    if file.sha1 is None:
+        return os.path.exists(file.dest)
+    if file_index.is_verified(file.dest, file.sha1):
+        return True
+    try:
+        return os.path.getsize(file.dest) == file.size
+    except OSError:
+        return False
+
+def estimate(install_plan : InstallPlan, bandwidth : float|None = None) -> Estimate:
+    '''
+
+    Compares install_plan with what is on disk and in the store
+
+    The eta uses the latency and throughput mirrors has saved for every host
+    (its defaults for hosts in Estimate.unmeasured) and the per-host
+    connection limits, bandwidth in bytes per second caps the whole transfer
+
+    '''
+    result = Estimate()
+    host_seconds : dict[str, float] = {}
+
+    for file in install_plan.files:
+        result.total_files += 1
+        result.total_bytes += file.size
+        if __is_present(file):
+            continue
+
+        result.fetch_files += 1
+        result.fetch_bytes += file.size
+
+        url = mirrors.rank(file.urls, file.size)[0]
+        host = urlsplit(url).netloc
+        counters = result.hosts.setdefault(host, [0, 0])
+        counters[0] += 1
+        counters[1] += file.size
+        if not mirrors.is_measured(url):
+            result.unmeasured.add(host)
+        host_seconds[host] = host_seconds.get(host, 0.0) + mirrors.estimate(url, file.size)
+
+    # hosts download side by side, each over up to host_limit connections
+    result.eta = max((seconds / min(scheduler.host_limit(host), result.hosts[host][0]) for host, seconds in host_seconds.items()), default=0.0)
+    if bandwidth:
+        result.eta = max(result.eta, result.fetch_bytes / bandwidth)
+    return result
+
+def dry_run(requests : List[Tuple[Platform, str, str]], bandwidth : float|None = None) -> InstallPlan:
+    '''
+
+    Plans requests and prints what installing them would cost
+
+    returns the plan, execute(plan) installs it
+
+    '''
+    install_plan = plan(requests)
+    print(estimate(install_plan, bandwidth))
+    return install_plan
+
+def execute(install_plan : InstallPlan) -> List[Instance]:
+    '''
+
+    Downloads everything in install_plan at once, then installs the loaders
+    and links the pack files into every instance
+
+    returns the instances, the files that failed are in install_plan.failed
+
+    '''
+    results = download_files(install_plan.files)
+    by_dest = {file.dest: result for file, result in zip(install_plan.files, results)}
+
+    # everything these need is on disk now, what's left are natives and forge processors
+    for forge_version, mc_version in install_plan.loaders:
+        forge.download(forge_version, mc_version)
+    forge_versions = {f"{mc_version}-forge-{forge_version}" for forge_version, mc_version in install_plan.loaders}
+    for version in install_plan.versions - forge_versions:
+        vanilla.download_from_manifest(version)
+
+    for instance in install_plan.instances:
+        files = install_plan.pack_files[instance.directory]
+        stored = mod_store.to_store(files)
+        instance_results = [(by_dest[file.dest][0], file, by_dest[file.dest][2]) for file in stored]
+        install_plan.failed += mod_store.materialize_files(files, instance_results)
+
+        if instance.platform == Platform.CURSEFORGE:
+            curseforge.extract_overrides(install_plan.manifests[instance.directory], os.path.join(instance.directory, "minecraft"))
+
+        instance.save()
+        try:
+            instance.build_launch_plan()
+        except (OSError, ValueError) as e:
+            print("launch plan not built, it will be built on launch: " + str(e))
+        instance_index.update(instance, state=InstallState.INSTALLED.value, size=instance_index.disk_usage(instance.directory))
+        print("initialized " + instance.mp_name)
+
+    install_plan.failed += [file for success, file, _ in results if not success and not file.dest.startswith(constants.STORE_PATH)]
+
+    print(mod_store.format_report())
+    for file in install_plan.failed:
+        print(Colors.RED + "Failed to download " + os.path.basename(file.dest) + Colors.END)
+    return install_plan.instances
+
+def install(requests : List[Tuple[Platform, str, str]]) -> List[Instance]:
+    return execute(plan(requests))
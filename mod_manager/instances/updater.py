@@ -0,0 +1,94 @@
+'''
+
+    Diffing of two pack versions for Instance.update
+
+'''
+
+import os
+from typing import List, Tuple
+from .. import file_index
+from ..data_structures import File, UpdatePolicy
+
+class PackDiff():
+
+    def __init__(self):
+        self.added : List[File] = []
+        self.changed : List[File] = []
+        self.removed : List[File] = []
+        self.unchanged : List[File] = []
+        # files left alone because the user modified them
+        self.kept : List[File] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": len(self.unchanged),
+            "kept": len(self.kept),
+            "download_bytes": sum(file.size for file in self.added + self.changed),
+        }
+
+def diff_files(old_files : List[File], new_files : List[File]) -> PackDiff:
+    '''
+
+    Compares two pack file lists by destination and sha1
+
+    '''
+    diff = PackDiff()
+    old_by_dest = {file.dest: file for file in old_files}
+    new_dests = set()
+
+    for file in new_files:
+        new_dests.add(file.dest)
+        old = old_by_dest.get(file.dest)
+        if old is None:
+            diff.added.append(file)
+        elif old.sha1 != file.sha1:
+            diff.changed.append(file)
+        else:
+            diff.unchanged.append(file)
+
+    diff.removed = [file for file in old_files if file.dest not in new_dests]
+    return diff
+
+def is_protected(file : File, directory : str) -> bool:
+    # mods have to match the pack, everything else (config, scripts, ...) belongs to the user once changed
+    return os.path.relpath(file.dest, directory).split(os.sep)[0] != "mods"
+
+def __is_modified(file : File, expected_sha1 : str|None) -> bool:
+    if not os.path.exists(file.dest):
+        return False
+    return expected_sha1 is None or not file_index.check(file.dest, expected_sha1)
+
+def apply_policy(diff : PackDiff, old_files : List[File], directory : str, policy : UpdatePolicy) -> Tuple[List[File], List[File]]:
+    '''
+
+    Decides which files an update has to fetch and which it has to delete
+
+    returns Tuple (to_fetch, to_delete)
+
+    '''
+    if policy == UpdatePolicy.OVERWRITE:
+        return diff.added + diff.changed, [file for file in diff.removed if os.path.exists(file.dest)]
+
+    old_sha1 = {file.dest: file.sha1 for file in old_files}
+    to_fetch, to_delete = [], []
+
+    for file in diff.added + diff.changed:
+        # an added file that already exists wasn't put there by the old version
+        expected = old_sha1.get(file.dest)
+        if is_protected(file, directory) and __is_modified(file, expected) and not (expected is None and file_index.check(file.dest, file.sha1)):
+            diff.kept.append(file)
+        else:
+            to_fetch.append(file)
+
+    for file in diff.removed:
+        if not os.path.exists(file.dest):
+            continue
+        if is_protected(file, directory) and __is_modified(file, file.sha1):
+            diff.kept.append(file)
+        else:
+            to_delete.append(file)
+
+    return to_fetch, to_delete
@@ -0,0 +1,167 @@
+'''
+
+    Integrity check of an installed instance against its manifests
+
+'''
+
+import os
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from .. import constants, file_index, mod_store
+from ..data_structures import File, Platform, UpdatePolicy
+from ..downloaders import ftb, curseforge, vanilla
+from ..downloaders.file_downloader import download_files
+from . import updater
+
+# files at least this big are hashed through mmap, smaller ones with buffered reads
+MMAP_THRESHOLD = 4 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+class VerifyReport():
+
+    def __init__(self):
+        self.checked = 0
+        self.checked_bytes = 0
+        self.missing : List[File] = []
+        self.corrupt : List[File] = []
+        # files in the pack's mods folder that no manifest mentions
+        self.extra : List[str] = []
+        # pack files outside mods/ that differ from the pack, the user's edits unless the policy overwrites them
+        self.modified : List[File] = []
+        self.repaired : List[File] = []
+        self.failed : List[File] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.corrupt and len(self.failed) == 0
+
+    def to_dict(self) -> dict:
+        return {
+            "checked": self.checked,
+            "checked_bytes": self.checked_bytes,
+            "missing": [file.dest for file in self.missing],
+            "corrupt": [file.dest for file in self.corrupt],
+            "extra": self.extra,
+            "modified": [file.dest for file in self.modified],
+            "repaired": [file.dest for file in self.repaired],
+            "failed": [file.dest for file in self.failed],
+        }
+
+def hash_file(path : str) -> str:
+    # hashlib drops the GIL while hashing big buffers, so this scales across threads
+    digest = hashlib.sha1()
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            while chunk := f.read(READ_BUFFER_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def __check(file : File) -> str:
+    '''
+
+    returns "ok", "missing" or "corrupt"
+
+    '''
+    if not os.path.exists(file.dest):
+        return "missing"
+    if file.sha1 is None:
+        return "ok"
+    if hash_file(file.dest) != file.sha1:
+        return "corrupt"
+    file_index.record(file.dest, file.sha1)
+    return "ok"
+
+def verify_files(files : List[File], report : VerifyReport|None = None, workers : int|None = None) -> VerifyReport:
+    '''
+
+    Hashes every file, ignoring the verified-file index
+
+    '''
+    if report is None:
+        report = VerifyReport()
+    unique = list({file.dest: file for file in files}.values())
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or constants.THREAD_POOL_WORKERS) as pool:
+        for file, state in zip(unique, pool.map(__check, unique)):
+            report.checked += 1
+            if state == "missing":
+                report.missing.append(file)
+            elif state == "corrupt":
+                report.corrupt.append(file)
+            else:
+                report.checked_bytes += file.size
+    return report
+
+def __find_extra(pack_files : List[File], directory : str) -> List[str]:
+    expected = {os.path.normpath(file.dest) for file in pack_files}
+    mods = os.path.join(directory, "mods")
+    extra = []
+    for root, _, names in os.walk(mods):
+        for name in names:
+            path = os.path.join(root, name)
+            if path not in expected:
+                extra.append(path)
+    return extra
+
+def verify(instance, repair : bool = False, policy : UpdatePolicy = UpdatePolicy.KEEP_MODIFIED) -> VerifyReport:
+    '''
+
+    Checks the pack files, libraries, assets and client jars of instance
+
+    With repair only the missing and corrupt files are downloaded again.
+    Changed pack files outside mods/ are reported as modified and, like in
+    Instance.update, only count as corrupt with UpdatePolicy.OVERWRITE
+
+    '''
+    directory = os.path.join(instance.directory, "minecraft")
+
+    pack = None
+    pack_files = []
+    match instance.platform:
+        case Platform.FEEDTHEBEAST:
+            pack = ftb
+        case Platform.CURSEFORGE:
+            pack = curseforge
+    if pack is not None:
+        version_manifest = pack.get_version_manifest(instance.mp_version)
+        # the curseforge overrides zip is deleted after extracting it
+        pack_files = [file for file, f in zip(pack.get_files(version_manifest, directory), version_manifest["files"]) if f.get("type") != "cf-extract"]
+
+    game_files = vanilla.get_files(instance.get_version_name())
+
+    report = verify_files(pack_files + game_files)
+    if pack is not None:
+        report.extra = __find_extra(pack_files, directory)
+        protected = {file.dest for file in pack_files if updater.is_protected(file, directory)}
+        report.modified = [file for file in report.corrupt if file.dest in protected]
+        if policy == UpdatePolicy.KEEP_MODIFIED:
+            report.corrupt = [file for file in report.corrupt if file.dest not in protected]
+
+    if repair:
+        bad = report.missing + report.corrupt
+        bad_dests = {file.dest for file in bad}
+
+        # the index could still vouch for a corrupted file or its store object
+        for file in bad:
+            file_index.invalidate(file.dest)
+            if file.sha1:
+                file_index.invalidate(mod_store.store_path(file.sha1))
+
+        bad_pack = [file for file in pack_files if file.dest in bad_dests]
+        if bad_pack:
+            report.failed += pack.install_files(bad_pack)
+
+        bad_game = [file for file in game_files if file.dest in bad_dests]
+        if bad_game:
+            report.failed += [file for success, file, _ in download_files(bad_game) if not success]
+
+        failed = {file.dest for file in report.failed}
+        report.repaired = [file for file in bad if file.dest not in failed]
+
+    return report
@@ -0,0 +1,132 @@
+'''
+
+    On-disk cache for json metadata (modpacks.ch, piston-meta, ...)
+
+    Entries younger than METADATA_CACHE_TTL are served without a request,
+    older ones are revalidated with If-None-Match / If-Modified-Since.
+    In OFFLINE_MODE only the cache is used.
+
+'''
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import requests
+from . import constants, http_client
+
+CACHE_PATH = os.path.join(constants.META_PATH, "http_cache")
+
+__memory : dict[str, dict] = {}
+__lock = threading.Lock()
+
+def __entry_path(key : str) -> str:
+    return os.path.join(CACHE_PATH, key[0:2], key + ".json")
+
+def __cache_key(url : str, headers : dict|None) -> str:
+    raw = url
+    if headers:
+        raw += json.dumps(headers, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def __read_entry(key : str) -> dict|None:
+    with __lock:
+        if key in __memory:
+            return __memory[key]
+    try:
+        with open(__entry_path(key), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with __lock:
+        __memory[key] = entry
+    return entry
+
+def __write_entry(key : str, entry : dict):
+    with __lock:
+        __memory[key] = entry
+    path = __entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+def __is_error(body) -> bool:
+    # modpacks.ch answers 200 with {"status": "error"} for unknown ids
+    return isinstance(body, dict) and body.get("status") == "error"
+
+def get_json(url : str, headers : dict|None = None, max_age : float|None = None):
+    '''
+
+    Fetches url as json going through the cache
+
+    max_age overrides METADATA_CACHE_TTL for this call, 0 always revalidates
+
+    '''
+    if max_age is None:
+        max_age = constants.METADATA_CACHE_TTL
+
+    key = __cache_key(url, headers)
+    entry = __read_entry(key)
+
+    if entry is not None:
+        if constants.OFFLINE_MODE or time.time() - entry["fetched_at"] < max_age:
+            return entry["body"]
+    elif constants.OFFLINE_MODE:
+        raise ConnectionError("Offline mode and " + url + " is not cached")
+
+    request_headers = dict(headers) if headers else {}
+    if entry is not None:
+        if entry.get("etag"):
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        r = http_client.get_session().get(url, headers=request_headers, timeout=constants.JSON_REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        # serve stale metadata rather than failing an install on a flaky api
+        if entry is not None:
+            return entry["body"]
+        raise e
+
+    if r.status_code == 304 and entry is not None:
+        entry = dict(entry, fetched_at=time.time())
+        __write_entry(key, entry)
+        return entry["body"]
+
+    body = r.json()
+
+    if r.ok and not __is_error(body):
+        __write_entry(key, {
+            "url": url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "body": body,
+        })
+
+    return body
+
+def invalidate(url : str|None = None, headers : dict|None = None):
+    '''
+
+    Drops the entry for url, or the whole cache if no url is given
+
+    '''
+    with __lock:
+        if url is None:
+            __memory.clear()
+        else:
+            __memory.pop(__cache_key(url, headers), None)
+    if url is None:
+        if os.path.exists(CACHE_PATH):
+            shutil.rmtree(CACHE_PATH)
+        return
+    try:
+        os.remove(__entry_path(__cache_key(url, headers)))
+    except FileNotFoundError:
+        pass
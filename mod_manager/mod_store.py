@@ -0,0 +1,157 @@
+'''
+
+    Content-addressed store for pack files shared by every instance
+
+    Files are kept at STORE_PATH/<sha1[0:2]>/<sha1> like the asset objects
+    and materialized into instance directories as reflinks, hardlinks or,
+    if the filesystem supports neither, copies. Only mod jars and pack zips
+    are hardlinked, see is_immutable
+
+'''
+
+import os
+import shutil
+import threading
+from typing import List
+from . import constants, file_index
+from .data_structures import Colors, File
+from .downloaders import file_downloader
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__stats = {"files": 0, "fetched_bytes": 0, "reused_bytes": 0, "linked_bytes": 0, "copied_bytes": 0}
+__lock = threading.Lock()
+
+def store_path(sha1 : str) -> str:
+    return os.path.join(constants.STORE_PATH, sha1[0:2], sha1)
+
+def __reflink(source : str, dest : str) -> bool:
+    if fcntl is None:
+        return False
+    # FICLONE, shares the extents copy-on-write on btrfs / xfs
+    ficlone = 0x40049409
+    try:
+        with open(source, "rb") as src, open(dest, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), ficlone, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dest):
+            os.remove(dest)
+        return False
+
+def __hardlink(source : str, dest : str) -> bool:
+    try:
+        os.link(source, dest)
+        return True
+    except OSError:
+        return False
+
+def is_immutable(dest : str) -> bool:
+    '''
+
+    returns whether dest is content nobody writes to in place (mod jars,
+    resource and shader pack zips), only those may share the store's inode
+
+    '''
+    return os.path.basename(os.path.dirname(dest)) in constants.STORE_HARDLINK_FOLDERS \
+        and os.path.splitext(dest)[1].lower() in constants.STORE_HARDLINK_EXTENSIONS
+
+def materialize(sha1 : str, dest : str) -> str:
+    '''
+
+    Places the stored object sha1 at dest
+
+    returns the method used: "present", "reflink", "hardlink" or "copy"
+
+    '''
+    source = store_path(sha1)
+    hardlink = is_immutable(dest)
+
+    if os.path.exists(dest):
+        linked = os.path.samefile(source, dest)
+        # a mutable file linked by an older version gets its own copy
+        if (linked and hardlink) or (not linked and file_index.is_verified(dest, sha1)):
+            return "present"
+        os.remove(dest)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    for method in constants.STORE_LINK_METHODS:
+        if method == "reflink" and __reflink(source, dest):
+            file_index.record(dest, sha1)
+            return method
+        if method == "hardlink" and hardlink and __hardlink(source, dest):
+            return method
+
+    shutil.copyfile(source, dest)
+    file_index.record(dest, sha1)
+    return "copy"
+
+def to_store(files : List[File]) -> List[File]:
+    '''
+
+    returns a copy of files pointing at the store, files without a sha1 are returned unchanged
+
+    '''
+    return [File(file.urls, store_path(file.sha1), file.sha1, file.size, file.priority) if file.sha1 else file for file in files]
+
+def materialize_files(files : List[File], results : List) -> List[File]:
+    '''
+
+    Links every successfully stored file to its real destination
+
+    files are the instance files, results the download_files results of to_store(files)
+
+    returns the files that could not be materialized
+
+    '''
+    failed = []
+    for file, (success, stored, skipped) in zip(files, results):
+        if not success:
+            failed.append(file)
+            continue
+        if stored is file:
+            continue
+
+        method = materialize(file.sha1, file.dest)
+
+        with __lock:
+            __stats["files"] += 1
+            __stats["reused_bytes" if skipped else "fetched_bytes"] += file.size
+            if method == "copy":
+                __stats["copied_bytes"] += file.size
+            else:
+                __stats["linked_bytes"] += file.size
+    return failed
+
+def download(files : List[File]) -> List[File]:
+    '''
+
+    Fetches files into the store and materializes them at their destinations
+
+    returns the files that failed
+
+    '''
+    results = file_downloader.download_files(to_store(files))
+    failed = materialize_files(files, results)
+    print(format_report())
+    for file in failed:
+        print(Colors.RED + "Failed to download " + os.path.basename(file.dest) + Colors.END)
+    return failed
+
+def report() -> dict:
+    '''
+
+    returns counters since process start, "reused_bytes" were served from the
+    store instead of the network, "linked_bytes" share disk space with the store
+
+    '''
+    with __lock:
+        return dict(__stats)
+
+def format_report() -> str:
+    stats = report()
+    return f"store: {stats['files']} files, {stats['reused_bytes'] / 1024 / 1024:.1f} MiB reused, " \
+           f"{stats['fetched_bytes'] / 1024 / 1024:.1f} MiB fetched, {stats['linked_bytes'] / 1024 / 1024:.1f} MiB linked instead of copied"
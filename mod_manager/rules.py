@@ -0,0 +1,157 @@
+'''
+
+    Evaluates the rules of libraries and arguments in version jsons
+
+    "rules": [{"action": "allow", "os": {"name": "osx", "version": "^10\\.", "arch": "x86"}},
+              {"action": "disallow", "features": {"is_demo_user": true}}]
+
+    The rules are walked in order and the last one that applies decides, an
+    entry without rules is allowed, one where no rule applies is not.
+
+    The facts about the host are read once. Every distinct rule set is
+    compiled once and its result is kept per set of features, so a manifest
+    chain with hundreds of libraries only evaluates a handful of rule sets.
+
+'''
+
+import re
+import sys
+import platform
+from typing import List
+from . import utils
+
+class Host():
+
+    def __init__(self, os_name : str, os_version : str, arch : str):
+        # os_name is "windows", "linux" or "osx" like in the version jsons
+        self.os_name = os_name
+        self.os_version = os_version
+        self.arch = arch
+
+    @staticmethod
+    def detect():
+        machine = platform.machine().lower()
+        if machine in ("i386", "i486", "i586", "i686", "x86") or (machine in ("x86_64", "amd64") and sys.maxsize <= 2**32):
+            arch = "x86"
+        elif machine in ("x86_64", "amd64"):
+            arch = "x86_64"
+        elif machine in ("arm64", "aarch64"):
+            arch = "arm64"
+        else:
+            arch = machine
+
+        # the same strings java reports as os.version, which the version patterns are written against
+        if sys.platform == "win32":
+            os_version = platform.version()
+        elif sys.platform == "darwin":
+            os_version = platform.mac_ver()[0]
+        else:
+            os_version = platform.release()
+
+        return Host(utils.get_sys_platform(), os_version, arch)
+
+class Rule():
+
+    def __init__(self, rule : dict):
+        if rule["action"] not in ("allow", "disallow"):
+            raise ValueError("Unknown action '" + rule["action"] + "'")
+        self.allow = rule["action"] == "allow"
+
+        conditions = rule.get("os", {})
+        self.os_name = conditions.get("name")
+        self.os_version = re.compile(conditions["version"]) if "version" in conditions else None
+        self.arch = conditions.get("arch")
+        self.features = rule.get("features", {})
+
+    def applies(self, host : Host, features : dict) -> bool:
+        if self.os_name is not None and self.os_name != host.os_name:
+            return False
+        if self.os_version is not None and not self.os_version.match(host.os_version):
+            return False
+        if self.arch is not None and self.arch != host.arch:
+            return False
+        return all(features.get(name, False) == value for name, value in self.features.items())
+
+class RuleSet():
+
+    def __init__(self, rules : List[dict]):
+        self.rules = [Rule(rule) for rule in rules]
+        # features key -> result
+        self.results : dict[tuple, bool] = {}
+
+    def allows(self, host : Host, features : dict) -> bool:
+        allowed = False
+        for rule in self.rules:
+            if rule.applies(host, features):
+                allowed = rule.allow
+        return allowed
+
+__host : Host|None = None
+# repr of a rule list -> its compiled form, equal lists from different manifests share it.
+# manifests only use a handful of distinct rule lists, so this stays small
+__compiled : dict[str, RuleSet] = {}
+
+def host() -> Host:
+    '''
+
+    returns the facts about this machine, read on first use
+
+    '''
+    global __host
+    if __host is None:
+        __host = Host.detect()
+    return __host
+
+def reset(new_host : Host|None = None):
+    '''
+
+    Forgets every compiled rule set, new_host replaces the detected facts
+
+    '''
+    global __host
+    __host = new_host
+    __compiled.clear()
+
+def compile_rules(rules : List[dict]) -> RuleSet:
+    key = repr(rules)
+    compiled = __compiled.get(key)
+    if compiled is None:
+        compiled = __compiled.setdefault(key, RuleSet(rules))
+    return compiled
+
+def allows(rules : List[dict]|None, features : dict|None = None) -> bool:
+    '''
+
+    returns whether an entry with rules applies to this machine, features
+    are launcher features like is_demo_user or has_custom_resolution and
+    default to off
+
+    '''
+    if not rules:
+        return True
+
+    compiled = compile_rules(rules)
+    features_key = tuple(sorted(features.items())) if features else ()
+    result = compiled.results.get(features_key)
+    if result is None:
+        result = compiled.results[features_key] = compiled.allows(host(), features or {})
+    return result
+
+def filter_arguments(args : List, features : dict|None = None) -> List[str]:
+    '''
+
+    returns the arguments of a version json's "jvm" or "game" list that
+    apply, conditional values expanded in place
+
+    '''
+    new_args = []
+    for arg in args:
+        if isinstance(arg, str):
+            new_args.append(arg)
+        elif allows(arg.get("rules"), features):
+            value = arg["value"]
+            if isinstance(value, str):
+                new_args.append(value)
+            else:
+                new_args += value
+    return new_args
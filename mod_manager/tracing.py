@@ -0,0 +1,198 @@
+'''
+
+    Phase level tracing of installs and launches
+
+    with tracing.span("assets") as span:
+        ...
+        span.add(nbytes=size, files=1)
+
+    Spans nest per thread and carry byte and file counters. Finished spans
+    can be exported as Chrome trace events (chrome://tracing, Perfetto) or
+    summed up per phase. While tracing is disabled span() hands out a
+    shared object that does nothing.
+
+    Setting MODMANAGER_TRACE to a file path enables tracing for the whole
+    process and writes the Chrome trace there at exit.
+
+'''
+
+import os
+import json
+import time
+import atexit
+import threading
+from typing import List
+from . import constants
+
+class Span():
+
+    def __init__(self, name : str, parent, args : dict):
+        self.name = name
+        self.parent = parent
+        self.path = parent.path + (name,) if parent is not None else (name,)
+        self.args = args
+        self.bytes = 0
+        self.files = 0
+        self.thread = threading.get_ident()
+        self.start = 0.0
+        self.end = 0.0
+
+    def add(self, nbytes : int = 0, files : int = 0):
+        self.bytes += nbytes
+        self.files += files
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        _push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _pop(self)
+        return False
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+class NullSpan():
+
+    path = ()
+
+    def add(self, nbytes : int = 0, files : int = 0):
+        pass
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = NullSpan()
+
+__enabled = False
+__spans : List[Span] = []
+__lock = threading.Lock()
+__local = threading.local()
+__origin = time.perf_counter()
+
+def __stack() -> List[Span]:
+    if not hasattr(__local, "stack"):
+        __local.stack = []
+    return __local.stack
+
+# called from Span, where __names would be mangled
+def _push(s : Span):
+    __stack().append(s)
+
+def _pop(s : Span):
+    stack = __stack()
+    if stack and stack[-1] is s:
+        stack.pop()
+    with __lock:
+        __spans.append(s)
+
+def enable():
+    global __enabled
+    __enabled = True
+
+def disable():
+    global __enabled
+    __enabled = False
+
+def is_enabled() -> bool:
+    return __enabled
+
+def reset():
+    with __lock:
+        __spans.clear()
+
+def span(name : str, parent : Span|None = None, **args) -> Span|NullSpan:
+    '''
+
+    returns a context manager timing name, nested under parent or the
+    innermost open span of this thread
+
+    Pass parent for work handed to other threads
+
+    '''
+    if not __enabled:
+        return NULL_SPAN
+    if parent is None:
+        stack = __stack()
+        parent = stack[-1] if stack else None
+    return Span(name, parent if isinstance(parent, Span) else None, args)
+
+def current() -> Span|NullSpan:
+    '''
+
+    returns the innermost open span of this thread
+
+    '''
+    if not __enabled:
+        return NULL_SPAN
+    stack = __stack()
+    return stack[-1] if stack else NULL_SPAN
+
+def get_spans() -> List[Span]:
+    with __lock:
+        return sorted(__spans, key=lambda s: s.start)
+
+def to_chrome_trace() -> dict:
+    pid = os.getpid()
+    events = []
+    for s in get_spans():
+        args = dict(s.args, bytes=s.bytes, files=s.files)
+        events.append({
+            "name": s.name,
+            "cat": s.path[0],
+            "ph": "X",
+            "ts": (s.start - __origin) * 1e6,
+            "dur": s.seconds * 1e6,
+            "pid": pid,
+            "tid": s.thread,
+            "args": {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value) for key, value in args.items()},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def export_chrome(path : str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(), f)
+
+def summary() -> str:
+    '''
+
+    returns a table of every phase with its count, total seconds, bytes and files
+
+    '''
+    totals : dict[tuple, List] = {}
+    for s in get_spans():
+        entry = totals.setdefault(s.path, [s.start, 0, 0.0, 0, 0])
+        entry[0] = min(entry[0], s.start)
+        entry[1] += 1
+        entry[2] += s.seconds
+        entry[3] += s.bytes
+        entry[4] += s.files
+
+    # parents before their children, siblings in the order they started
+    def order(path):
+        return tuple(totals[path[:i + 1]][0] if path[:i + 1] in totals else 0.0 for i in range(len(path)))
+
+    lines = [f"{'phase':<44} {'count':>6} {'seconds':>9} {'MiB':>9} {'files':>7}"]
+    for path in sorted(totals, key=order):
+        _, count, seconds, nbytes, files = totals[path]
+        name = "  " * (len(path) - 1) + path[-1]
+        lines.append(f"{name:<44} {count:6} {seconds:9.2f} {nbytes / 1024 / 1024:9.1f} {files:7}")
+    return "\n".join(lines)
+
+if constants.TRACE_PATH:
+    enable()
+    atexit.register(lambda: export_chrome(constants.TRACE_PATH))
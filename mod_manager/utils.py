@@ -1,48 +1,191 @@
 import os
 import math
 import re
-import requests
 import sys
 import hashlib
-from . import constants
+import json
+import threading
+from contextlib import contextmanager
+from typing import Callable, Tuple
+import shutil
+from . import constants, file_index
 
-def get_json(url, headers=None):
-    if headers:
-        return requests.get(url, headers=headers, timeout=constants.JSON_REQUEST_TIMEOUT).json()
-    return requests.get(url, timeout=constants.JSON_REQUEST_TIMEOUT).json()
+# requests and the modules built on it are imported where they are used,
+# the launch path only needs the small helpers at the bottom
+
+def get_json(url, headers=None, max_age : float|None = None):
+    from . import metadata_cache
+    return metadata_cache.get_json(url, headers, max_age)
+
+# dest -> [lock, number of downloads holding or waiting for it], dropped when that reaches 0
+__dest_locks : dict[str, list] = {}
+__dest_locks_lock = threading.Lock()
+
+@contextmanager
+def __dest_lock(dest : str):
+    with __dest_locks_lock:
+        entry = __dest_locks.setdefault(dest, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with __dest_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del __dest_locks[dest]
+
+def __read_journal(journal_path : str) -> dict|None:
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def __write_journal(journal_path : str, journal : dict):
+    with open(journal_path, "w", encoding="utf-8") as f:
+        json.dump(journal, f)
+
+def __remove_partial(part_path : str, journal_path : str):
+    for path in (part_path, journal_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def __resume_offset(part_path : str, journal_path : str, url : str, sha1 : str|None, digest) -> int:
+    '''
+
+    Feeds an existing .part file into digest if its journal belongs to the same file
+
+    returns the number of bytes that can be skipped
 
-def download_file(url, dest, sha1 : str|None = None, download_if_not_exists = True):
     '''
+    journal = __read_journal(journal_path)
+    if journal is None or not os.path.exists(part_path):
+        __remove_partial(part_path, journal_path)
+        return 0
+
+    # without a hash only a part from the very same url can be trusted
+    if journal.get("sha1") != sha1 or (sha1 is None and journal.get("url") != url):
+        __remove_partial(part_path, journal_path)
+        return 0
+
+    with open(part_path, "rb") as f:
+        while chunk := f.read(constants.DOWNLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+        return f.tell()
+
+def download_file(url, dest, sha1 : str|None = None, download_if_not_exists = True, size : int|None = None,
+                  part_suffix : str = ".part", cancel : threading.Event|None = None, progress : Callable[[int], None]|None = None):
+    '''
+
+    Streams url into dest.part while hashing it and only moves it into
+    place once the sha1 and size (if given) matched
+
+    An interrupted download leaves the .part file and a small .part.json
+    journal behind, the next call resumes it with a Range request
+
+    Setting cancel aborts the transfer and drops its part file, a different
+    part_suffix lets two fetches of the same dest race each other.
+    progress is called with the size of every chunk written
 
     returns Tuple (had_success, has_skipped)
 
     '''
-    
+
     if download_if_not_exists and sha1:
-        if os.path.exists(dest):
-            with open(dest, "rb") as f:
-                if hashlib.file_digest(f, "sha1").hexdigest() == sha1:
-                    return (True, True)
-
-    r = requests.get(url, timeout=constants.JSON_REQUEST_TIMEOUT)
-    with open(dest, 'wb') as f:
-        f.write(r.content)
-    
-    if sha1:
-        if os.path.exists(dest):
-            with open(dest, "rb") as f:
-                if hashlib.file_digest(f, "sha1").hexdigest() == sha1:
-                    return (True, False)
+        if file_index.check(dest, sha1):
+            return (True, True)
+
+    from requests.exceptions import ChunkedEncodingError
+
+    part_path = dest + part_suffix
+    journal_path = part_path + ".json"
+
+    with __dest_lock(part_path):
+        attempt = 0
+        while True:
+            try:
+                return __fetch_part(url, dest, sha1, size, part_path, journal_path, cancel, progress)
+            except ChunkedEncodingError as e:
+                # the connection dropped mid-body, pick up where it stopped
+                attempt += 1
+                if attempt > constants.HTTP_RETRIES:
+                    raise e
+
+def __fetch_part(url, dest, sha1, size, part_path, journal_path, cancel, progress) -> Tuple[bool, bool]:
+    from . import http_client
+    digest = hashlib.sha1()
+    offset = __resume_offset(part_path, journal_path, url, sha1, digest)
+    journaled = os.path.exists(journal_path)
+
+    headers = {"Accept-Encoding": "identity"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+
+    journal = {"url": url, "sha1": sha1, "size": size, "received": offset}
+
+    with http_client.get_session().get(url, stream=True, headers=headers, timeout=constants.JSON_REQUEST_TIMEOUT) as r:
+        if offset > 0 and r.status_code == 416:
+            # nothing left to fetch, the part is already complete
+            pass
+        elif not r.ok:
+            return (False, False)
+        else:
+            if offset > 0 and r.status_code != 206:
+                # the server ignored the range, start over
+                digest = hashlib.sha1()
+                offset = 0
+
+            # small bodies are cheaper to fetch again than to journal, unless they get interrupted
+            length = size if size is not None else offset + int(r.headers.get("Content-Length", 0))
+            if not journaled and length >= constants.DOWNLOAD_JOURNAL_MIN_SIZE:
+                __write_journal(journal_path, journal)
+                journaled = True
+
+            with open(part_path, "ab" if offset > 0 else "wb") as f:
+                try:
+                    for chunk in r.iter_content(chunk_size=constants.DOWNLOAD_CHUNK_SIZE):
+                        if cancel is not None and cancel.is_set():
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                        if progress is not None:
+                            progress(len(chunk))
+                except BaseException as e:
+                    journal["received"] = f.tell()
+                    __write_journal(journal_path, journal)
+                    raise e
+
+    if cancel is not None and cancel.is_set():
+        __remove_partial(part_path, journal_path)
         return (False, False)
-    return(True, False)
 
-def print_with_progress(text : str, progress : float, offset=0):
-    
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    
-    print(text + " " * (os.get_terminal_size().columns - len(ansi_escape.sub("", text))+offset), end="")
+    # without a sha1 the size is all there is to catch a short or overlong body
+    if size is not None and os.path.getsize(part_path) != size:
+        __remove_partial(part_path, journal_path)
+        return (False, False)
+
+    if sha1 and digest.hexdigest() != sha1:
+        __remove_partial(part_path, journal_path)
+        return (False, False)
+
+    os.replace(part_path, dest)
+    if journaled:
+        os.remove(journal_path)
+    if sha1:
+        file_index.record(dest, sha1)
+
+    return (True, False)
+
+__ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+def print_with_progress(text : str, progress : float, offset=0, columns : int|None = None):
+    if columns is None:
+        columns = shutil.get_terminal_size().columns
+
+    print(text + " " * (columns - len(__ANSI_ESCAPE.sub("", text))+offset), end="")
 
-    maxchars = os.get_terminal_size().columns-10
+    maxchars = columns-10
     nr_of_hashtags = math.ceil(maxchars*progress)
     print("[" + ( "#" * nr_of_hashtags) + (" " * (maxchars-nr_of_hashtags)) + f"]{progress*100:>6.2f}%", end="\r")
 
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+# seconds for importing the command line and everything launch needs, generous for slow CI machines
+IMPORT_BUDGET = 0.5
+HEAVY_MODULES = ["requests", "PySide6", "mod_manager.downloaders.vanilla", "mod_manager.downloaders.loaders.forge"]
+
+# a vanilla 1.20.1 instance whose client jar is the only file to verify
+SETUP = """
+import os, json
+from hashlib import sha1
+from mod_manager import constants
+from mod_manager.data_structures import MCVersion, MPVersion, Platform
+from mod_manager.instances.instance import Instance
+client = os.path.join(constants.LIB_PATH, "net", "minecraft", "client", "1.20.1.jar")
+os.makedirs(os.path.dirname(client))
+with open(client, "wb") as f:
+    f.write(b"client")
+os.makedirs(os.path.join(constants.META_PATH, "minecraft"))
+with open(os.path.join(constants.META_PATH, "minecraft", "1.20.1.json"), "w") as f:
+    json.dump({"id": "1.20.1", "downloads": {"client": {"url": "", "sha1": sha1(b"client").hexdigest(), "size": 6}}, "assets": "5",
+               "mainClass": "net.minecraft.client.main.Main", "libraries": [],
+               "arguments": {"jvm": ["-cp", "${classpath}"], "game": ["--gameDir", "${game_directory}"]}}, f)
+instance = Instance.create_instance("Test Pack", MCVersion("1.20.1", "vanilla", ""), MPVersion("", "", ""), Platform.CUSTOM, initialize=False)
+instance.save()
+os.makedirs(os.path.join(instance.directory, "minecraft"))
+instance.build_launch_plan()
+print(json.dumps({"directory": instance.directory, "client": client}))
+"""
+
+def __run(code : str, home : str, path : str|None = None) -> dict:
+    env = dict(os.environ, HOME=home, APPDATA=home)
+    if path is not None:
+        env["PATH"] = path + os.pathsep + env.get("PATH", "")
+    completed = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.splitlines()[-1])
+
+def test_import_budget(tmp_path):
+    result = __run("""
+import sys, json, time
+start = time.perf_counter()
+import mod_manager.__main__
+from mod_manager.instances import instance, instance_index
+from mod_manager import constants
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": list(sys.modules), "base": constants.BASE_PATH}))
+""", str(tmp_path))
+
+    assert [name for name in HEAVY_MODULES if name in result["modules"]] == []
+    # nothing is created on import
+    assert not os.path.exists(result["base"])
+    assert result["seconds"] < IMPORT_BUDGET
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake java is a shell script")
+def test_launch_uses_index_and_plan(tmp_path):
+    home = tmp_path / "home"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    java = bin_dir / "java"
+    java.write_text(f"#!/bin/sh\necho \"$@\" > {tmp_path / 'argv'}\n")
+    java.chmod(0o755)
+
+    setup = __run(SETUP, str(home))
+
+    result = __run("""
+import sys, json
+from mod_manager.__main__ import main
+code = main(["launch", "Test Pack"])
+from mod_manager.instances import instance_index
+print(json.dumps({"code": code, "modules": list(sys.modules), "last_launched": instance_index.get("Test Pack")["last_launched"]}))
+""", str(home), str(bin_dir))
+
+    assert result["code"] == 0
+    assert result["last_launched"] is not None
+    assert [name for name in HEAVY_MODULES if name in result["modules"]] == []
+    argv = (tmp_path / "argv").read_text().split()
+    assert "net.minecraft.client.main.Main" in argv
+    assert argv[argv.index("--gameDir") + 1] == os.path.join(setup["directory"], "minecraft")
+
+def test_verify_reports_corrupt_files(tmp_path):
+    setup = __run(SETUP, str(tmp_path))
+    verify = """
+import json
+from mod_manager.__main__ import main
+print(json.dumps({"code": main(["verify", "Test Pack"])}))
+"""
+    assert __run(verify, str(tmp_path))["code"] == 0
+
+    with open(setup["client"], "wb") as f:
+        f.write(b"broken")
+    assert __run(verify, str(tmp_path))["code"] == 1
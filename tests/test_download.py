@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+import pytest
+from mod_manager import constants, file_index, utils
+from benchmarks import stub_server
+
+BODY = bytes(range(256)) * 400
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_index, "INDEX_PATH", str(tmp_path / "verified_files.json"))
+    catalog = stub_server.Catalog(scale=0.001)
+    catalog.add("https://files.example/blob.bin", BODY)
+    server = stub_server.StubServer(catalog)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    # saved while INDEX_PATH still points at tmp_path, so nothing is left to write at exit
+    file_index.invalidate()
+    file_index.save()
+
+def __interrupted(dest : str, url : str, sha1 : str|None, size : int|None, received : int):
+    with open(dest + ".part", "wb") as f:
+        f.write(BODY[:received])
+    with open(dest + ".part.json", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "sha1": sha1, "size": size, "received": received}, f)
+
+@pytest.mark.parametrize("sha1", [hashlib.sha1(BODY).hexdigest(), None])
+def test_resume_fetches_only_the_rest(tmp_path, server, sha1):
+    url = f"http://{server.address}/files.example/blob.bin"
+    dest = str(tmp_path / "blob.bin")
+    __interrupted(dest, url, sha1, len(BODY), 1000)
+
+    assert utils.download_file(url, dest, sha1, size=len(BODY)) == (True, False)
+    with open(dest, "rb") as f:
+        assert f.read() == BODY
+    assert server.stats.to_dict()["bytes"] == len(BODY) - 1000
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+@pytest.mark.parametrize("size", [len(BODY) + 1, len(BODY) - 1])
+def test_wrong_size_is_not_moved_into_place(tmp_path, server, size):
+    url = f"http://{server.address}/files.example/blob.bin"
+    dest = str(tmp_path / "blob.bin")
+    __interrupted(dest, url, None, size, 1000)
+
+    assert utils.download_file(url, dest, size=size) == (False, False)
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+def test_complete_part_is_checked_too(tmp_path, server):
+    # the server answers 416 and nothing is read, the part alone has to be right
+    url = f"http://{server.address}/files.example/blob.bin"
+    dest = str(tmp_path / "blob.bin")
+    __interrupted(dest, url, None, len(BODY) - 1, len(BODY))
+
+    assert utils.download_file(url, dest, size=len(BODY) - 1) == (False, False)
+    assert not os.path.exists(dest)
+
+def test_journal_only_when_interrupted(tmp_path, server, monkeypatch):
+    url = f"http://{server.address}/files.example/blob.bin"
+    journals = []
+    write_journal = utils.__write_journal
+    monkeypatch.setattr(utils, "__write_journal", lambda path, journal: journals.append(dict(journal)) or write_journal(path, journal))
+
+    # small and in one go, no journal at all
+    assert utils.download_file(url, str(tmp_path / "one.bin"), size=len(BODY)) == (True, False)
+    assert journals == []
+
+    # the first response is cut off halfway, the retry resumes from the journal
+    server.failure_rate = 1.0
+    server.rng.seed(4)
+    add = server.stats.add
+    def add_once(nbytes = 0, failed = False):
+        # counted before the connection closes, so the retry is served in full
+        server.failure_rate = 0.0
+        add(nbytes, failed)
+    monkeypatch.setattr(server.stats, "add", add_once)
+    monkeypatch.setattr(constants, "DOWNLOAD_CHUNK_SIZE", 4096)
+    dest = str(tmp_path / "two.bin")
+    assert utils.download_file(url, dest, size=len(BODY)) == (True, False)
+    assert len(journals) == 1 and 0 < journals[0]["received"] <= len(BODY) // 2
+    assert server.stats.to_dict()["bytes"] == len(BODY) + len(BODY) // 2 + len(BODY) - journals[0]["received"]
+    with open(dest, "rb") as f:
+        assert f.read() == BODY
+    assert not os.path.exists(dest + ".part.json")
+    assert utils.__dest_locks == {}
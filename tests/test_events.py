@@ -0,0 +1,30 @@
+from mod_manager import events
+from mod_manager.data_structures import File
+from mod_manager.events import EventType
+
+def test_overlapping_batches_keep_their_totals():
+    first, second = events.new_batch(), events.new_batch()
+    mine = events.ProgressStats(batch=first)
+    everything = events.ProgressStats()
+    a, b = File("https://a.example/a", "a", size=100), File("https://b.example/b", "b", size=300)
+    for stats in (mine, everything):
+        events.subscribe(stats)
+
+    try:
+        events.emit(EventType.BATCH_STARTED, files=[a], batch=first)
+        events.emit(EventType.FILE_FINISHED, a, a.urls[0], a.size, batch=first)
+        # a repair starting halfway through doesn't reset the first batch
+        events.emit(EventType.BATCH_STARTED, files=[b], batch=second)
+        events.emit(EventType.FILE_PROGRESS, b, b.urls[0], 150, batch=second)
+
+        assert (mine.total_bytes, mine.done_bytes, mine.transferred, mine.progress) == (100, 100, 0, 1.0)
+        assert (everything.total_files, everything.total_bytes, everything.done_bytes) == (2, 400, 100)
+
+        events.emit(EventType.BATCH_FINISHED, files=[a], batch=first)
+        events.emit(EventType.BATCH_FINISHED, files=[b], batch=second)
+        # once nothing runs the next batch starts from zero
+        events.emit(EventType.BATCH_STARTED, files=[b], batch=events.new_batch())
+        assert (everything.total_files, everything.total_bytes, everything.done_bytes) == (1, 300, 0)
+    finally:
+        for stats in (mine, everything):
+            events.unsubscribe(stats)
@@ -0,0 +1,55 @@
+import os
+import json
+import zipfile
+from mod_manager import file_index
+from mod_manager.downloaders.loaders import forge
+
+def test_processors_after_a_failure_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(forge, "PROCESSOR_STAMPS", str(tmp_path / "processors.json"))
+    monkeypatch.setattr(file_index, "INDEX_PATH", str(tmp_path / "verified_files.json"))
+    a, b, c, d = (os.path.join(str(tmp_path), name) for name in "abcd")
+
+    processors = [
+        forge.Processor(0, "x:broken:1", "Main", [], ["--out", a], {a: "0" * 40}, "0"),
+        forge.Processor(1, "x:uses-a:1", "Main", [], ["--in", a, "--out", b], {b: "0" * 40}, "1"),
+        forge.Processor(2, "x:uses-b:1", "Main", [], ["--in", b, "--out", c], {c: "0" * 40}, "2"),
+        forge.Processor(3, "x:independent:1", "Main", [], ["--out", d], {}, "3"),
+    ]
+    started = []
+    def fake_call(command):
+        started.append(command[4:])
+        return 1 if command[4:] == ["--out", a] else 0
+    monkeypatch.setattr(forge.subprocess, "call", fake_call)
+
+    try:
+        report = forge.run_processors(processors)
+    finally:
+        file_index.invalidate()
+        file_index.save()
+
+    assert [entry["status"] for entry in report] == ["failed (1)", "skipped (dependency failed)", "skipped (dependency failed)", "ok"]
+    assert sorted(started) == [["--out", a], ["--out", d]]
+
+def test_missing_tool_jar_is_looked_up_again(tmp_path):
+    jar = str(tmp_path / "tool.jar")
+    assert forge.__get_main_function(jar) is None
+
+    # a retry downloaded it
+    with zipfile.ZipFile(jar, "w") as zf:
+        zf.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\nMain-Class: net.example.Tool\n")
+    assert forge.__get_main_function(jar) == "net.example.Tool"
+
+def test_stale_version_json_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(forge.constants, "META_PATH", str(tmp_path / "meta"))
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    version = {"id": "1.20.1-forge-47.1.0", "inheritsFrom": "1.20.1", "libraries": []}
+    (cache_dir / "version.json").write_text(json.dumps(version))
+    published = tmp_path / "meta" / "minecraft" / "1.20.1-forge-47.1.0.json"
+
+    assert forge.__publish_version(str(cache_dir)) == version
+    assert json.loads(published.read_text()) == version
+
+    published.write_text('{"id": "1.20.1-forge-47.1.0", "libr')
+    forge.__publish_version(str(cache_dir))
+    assert json.loads(published.read_text()) == version
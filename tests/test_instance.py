@@ -1,5 +1,5 @@
 import os
-from instances.instance import Instance
+from mod_manager.instances.instance import Instance
 
 def test_instance_serializer():
     testdict = {
@@ -17,7 +17,7 @@ def test_instance_serializer():
             "platform": "ftb",
             "directory": "~/.modmanager/instances/stoneblock-3"
         }
-    instance = Instance("testing", testdict)
+    instance = Instance(testdict)
 
     for key, val in testdict.items():
         if(key == "directory"):
@@ -25,4 +25,4 @@ def test_instance_serializer():
             continue
 
 
-        assert instance.to_dict()[key] == val
\ No newline at end of file
+        assert instance.to_dict()[key] == val
@@ -0,0 +1,36 @@
+import os
+import json
+from mod_manager import constants
+from mod_manager.data_structures import MCVersion, MPVersion, Platform
+from mod_manager.instances import instance_index
+from mod_manager.instances.instance import Instance
+
+def test_index_follows_save_and_delete(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "INSTANCES_PATH", str(tmp_path))
+    monkeypatch.setattr(constants, "INSTANCES_INDEX", os.path.join(str(tmp_path), "index.json"))
+
+    instance = Instance.create_instance("My Pack", MCVersion("1.20.1", "forge", "47.1.0"), MPVersion("1.0", "100", "1"), Platform.FEEDTHEBEAST, initialize=False)
+    instance.save()
+    instance_index.update(instance, last_launched=5.0)
+
+    entries = instance_index.list_instances()
+    assert [(e["slug"], e["state"], e["last_launched"]) for e in entries] == [("my-pack", "created", 5.0)]
+    assert Instance.load("My Pack").to_dict() == instance.to_dict()
+
+    # a lost index comes back from the instance folders, keeping what it knew,
+    # without walking them for their size
+    os.remove(constants.INSTANCES_INDEX)
+    sized = []
+    monkeypatch.setattr(instance_index, "disk_usage", lambda directory: sized.append(directory) or 42)
+    assert [(e["slug"], e["size"]) for e in instance_index.list_instances()] == [("my-pack", None)]
+    assert Instance.load("My Pack").to_dict() == instance.to_dict()
+    assert sized == []
+
+    instance_index.update(instance, last_launched=7.0)
+    entry = instance_index.rebuild()[0]
+    assert (entry["last_launched"], entry["size"]) == (7.0, 42)
+
+    instance.delete()
+    assert instance_index.list_instances() == []
+    with open(constants.INSTANCES_INDEX, "r", encoding="utf-8") as f:
+        assert json.load(f)["instances"] == {}
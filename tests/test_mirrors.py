@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+import pytest
+from mod_manager import constants, utils
+from mod_manager.data_structures import File
+from mod_manager.downloaders import mirrors, file_downloader
+
+@pytest.fixture
+def hedging(tmp_path, monkeypatch):
+    monkeypatch.setattr(mirrors, "STATS_PATH", str(tmp_path / "mirrors.json"))
+    monkeypatch.setattr(constants, "MIRROR_HEDGE_FACTOR", 0.0)
+    monkeypatch.setattr(constants, "MIRROR_HEDGE_MIN_DELAY", 0.05)
+    mirrors.reset()
+    yield
+    mirrors.reset()
+
+def __download(file : File) -> tuple:
+    # the download runs in a thread so a hang fails the test instead of blocking it
+    outcome = {}
+    def run():
+        try:
+            outcome["result"] = file_downloader.download_files([file], show_progress=False)[0]
+        except BaseException as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive(), "download_files hung"
+    return outcome.get("result"), outcome.get("error")
+
+def test_hedge_wins_over_slow_mirror(tmp_path, monkeypatch, hedging):
+    cancelled = []
+    def fake_download(url, dest, sha1=None, size=None, part_suffix=".part", cancel=None, progress=None, **kwargs):
+        if "slow" in url:
+            cancel.wait(2)
+            cancelled.append(cancel.is_set())
+            return (False, False)
+        return (True, False)
+    monkeypatch.setattr(utils, "download_file", fake_download)
+
+    result, error = __download(File(["https://slow.example/f", "https://fast.example/f"], os.path.join(str(tmp_path), "f"), size=1024))
+
+    assert error is None and result[0]
+    time.sleep(0.1)
+    assert cancelled == [True]
+    stats = {entry["host"]: entry for entry in mirrors.get_stats()}
+    assert (stats["slow.example"]["successes"], stats["fast.example"]["successes"]) == (0, 1)
+    assert stats["slow.example"]["throughput"] is not None
+
+def test_hedge_does_not_hang_on_errors(tmp_path, monkeypatch, hedging):
+    def fake_download(url, dest, sha1=None, size=None, part_suffix=".part", cancel=None, progress=None, **kwargs):
+        if "disk" in url:
+            time.sleep(0.2)
+            raise OSError("disk full")
+        return (False, False)
+    monkeypatch.setattr(utils, "download_file", fake_download)
+
+    result, error = __download(File(["https://disk.example/f", "https://broken.example/f"], os.path.join(str(tmp_path), "f")))
+
+    # same as without a hedge, the local error reaches the caller
+    assert result is None and isinstance(error, OSError)
+
+def test_stats_outlive_the_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(mirrors, "STATS_PATH", str(tmp_path / "mirrors.json"))
+    mirrors.reset()
+    try:
+        mirrors.report_success("https://a.example/small", 0.5, 10)
+        mirrors.report_success("https://a.example/large", 2.5, 4 * 1024 * 1024)
+        expected = mirrors.estimate("https://a.example/f", 1024 * 1024)
+        mirrors.save()
+
+        # what a fresh process sees before its first download
+        monkeypatch.setattr(mirrors, "__hosts", None)
+        assert mirrors.is_measured("https://a.example/f")
+        assert mirrors.estimate("https://a.example/f", 1024 * 1024) == pytest.approx(expected)
+        assert not mirrors.is_measured("https://b.example/f")
+    finally:
+        mirrors.reset()
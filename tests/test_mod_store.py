@@ -0,0 +1,37 @@
+import os
+import hashlib
+from mod_manager import constants, file_index, mod_store
+
+def test_only_immutable_files_share_the_store_inode(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "STORE_PATH", str(tmp_path / "store"))
+    monkeypatch.setattr(constants, "STORE_LINK_METHODS", ["hardlink"])
+    monkeypatch.setattr(file_index, "INDEX_PATH", str(tmp_path / "verified_files.json"))
+    try:
+        sha1 = hashlib.sha1(b"content").hexdigest()
+        os.makedirs(os.path.dirname(mod_store.store_path(sha1)))
+        with open(mod_store.store_path(sha1), "wb") as f:
+            f.write(b"content")
+
+        mod = str(tmp_path / "instance" / "mods" / "a.jar")
+        config = str(tmp_path / "instance" / "config" / "a.jar")
+        assert mod_store.materialize(sha1, mod) == "hardlink"
+        assert mod_store.materialize(sha1, config) == "copy"
+        assert os.path.samefile(mod, mod_store.store_path(sha1))
+        assert not os.path.samefile(config, mod_store.store_path(sha1))
+
+        # rewriting the config in place leaves the store alone
+        with open(config, "r+b") as f:
+            f.write(b"CHANGED")
+        with open(mod_store.store_path(sha1), "rb") as f:
+            assert f.read() == b"content"
+
+        # a config hardlinked before gets its own copy
+        os.remove(config)
+        os.link(mod_store.store_path(sha1), config)
+        assert mod_store.materialize(sha1, config) == "copy"
+        assert not os.path.samefile(config, mod_store.store_path(sha1))
+        assert mod_store.materialize(sha1, mod) == "present"
+    finally:
+        # saved while INDEX_PATH still points at tmp_path, so nothing is left to write at exit
+        file_index.invalidate()
+        file_index.save()
@@ -0,0 +1,56 @@
+import os
+import pytest
+from mod_manager import mod_store
+from mod_manager.data_structures import File
+from mod_manager.downloaders import mirrors
+from mod_manager.instances import planner
+from mod_manager.instances.planner import InstallPlan
+
+def test_plan_deduplicates_shared_files(tmp_path):
+    sha = "a" * 40
+    first = [File("u", os.path.join(str(tmp_path), "one", "mods", "a.jar"), sha, 10)]
+    second = [File("u", os.path.join(str(tmp_path), "two", "mods", "renamed.jar"), sha, 10)]
+    library = File("u", os.path.join(str(tmp_path), "libraries", "lib.jar"), "b" * 40, 5)
+
+    install_plan = InstallPlan()
+    install_plan.add([library])
+    install_plan.add([library])
+    install_plan.add(mod_store.to_store(first))
+    install_plan.add(mod_store.to_store(second))
+
+    assert [file.dest for file in install_plan.files] == [library.dest, mod_store.store_path(sha)]
+    assert sum(file.size for file in install_plan.files) == 15
+
+@pytest.fixture
+def mirror_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(mirrors, "STATS_PATH", str(tmp_path / "mirrors.json"))
+    mirrors.reset()
+    yield
+    mirrors.reset()
+
+def test_estimate_counts_missing_files_per_host(tmp_path, mirror_stats):
+    present = os.path.join(str(tmp_path), "present.jar")
+    with open(present, "wb") as f:
+        f.write(b"12345")
+
+    install_plan = InstallPlan()
+    install_plan.add([
+        File("https://a.example/present.jar", present, None, 5),
+        File("https://a.example/one.jar", os.path.join(str(tmp_path), "one.jar"), "c" * 40, 100),
+        File("https://b.example/two.jar", os.path.join(str(tmp_path), "two.jar"), "d" * 40, 300),
+        # no sha1 to check, but still missing
+        File("https://b.example/three.jar", os.path.join(str(tmp_path), "three.jar"), None, 50),
+    ])
+
+    result = planner.estimate(install_plan, bandwidth=100)
+    assert (result.total_files, result.total_bytes) == (4, 455)
+    assert (result.fetch_files, result.fetch_bytes) == (3, 450)
+    assert result.hosts == {"a.example": [1, 100], "b.example": [2, 350]}
+    assert result.eta >= 4
+    assert result.unmeasured == {"a.example", "b.example"}
+
+    mirrors.report_success("https://a.example/x", 0.1, 10)
+    mirrors.report_success("https://a.example/y", 1.0, 1024 * 1024)
+    result = planner.estimate(install_plan)
+    assert result.unmeasured == {"b.example"}
+    assert "default speed" not in str(result).splitlines()[2] and "default speed" in str(result).splitlines()[1]
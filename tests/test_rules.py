@@ -0,0 +1,37 @@
+from mod_manager import rules
+
+def test_rules_follow_the_host():
+    rules.reset(rules.Host("windows", "10.0.19045", "x86_64"))
+    try:
+        osx_only = [{"action": "allow", "os": {"name": "osx"}}]
+        not_osx = [{"action": "allow"}, {"action": "disallow", "os": {"name": "osx"}}]
+        assert rules.allows(None)
+        assert not rules.allows(osx_only)
+        assert rules.allows(not_osx)
+        # an equal list from another manifest shares the compiled set
+        assert rules.compile_rules([dict(osx_only[0])]) is rules.compile_rules(osx_only)
+
+        args = [
+            {"rules": [{"action": "allow", "os": {"name": "windows", "version": "^10\\."}}], "value": ["-Dos.name=Windows 10"]},
+            {"rules": [{"action": "allow", "os": {"arch": "x86"}}], "value": "-Xss1M"},
+            {"rules": [{"action": "allow", "features": {"is_demo_user": True}}], "value": "--demo"},
+            "-cp", "${classpath}",
+        ]
+        assert rules.filter_arguments(args) == ["-Dos.name=Windows 10", "-cp", "${classpath}"]
+        assert rules.filter_arguments(args, {"is_demo_user": True}) == ["-Dos.name=Windows 10", "--demo", "-cp", "${classpath}"]
+
+        rules.reset(rules.Host("linux", "6.1.0", "x86"))
+        assert rules.allows(not_osx)
+        assert rules.filter_arguments(args) == ["-Xss1M", "-cp", "${classpath}"]
+    finally:
+        rules.reset()
+
+def test_fresh_manifests_do_not_grow_the_cache():
+    rules.reset(rules.Host("linux", "6.1.0", "x86_64"))
+    try:
+        for _ in range(100):
+            # every manifest read builds new lists with the same content
+            assert rules.allows([{"action": "allow", "os": {"name": "linux"}}])
+        assert len(rules.__compiled) == 1
+    finally:
+        rules.reset()
@@ -0,0 +1,41 @@
+from mod_manager.data_structures import File, Priority
+from mod_manager.downloaders import scheduler
+
+MB = 1024 * 1024
+
+def test_plan_order():
+    files = [
+        File("https://a/small1", "small1", size=10),
+        File("https://a/big1", "big1", size=5 * MB),
+        File("https://a/pack", "pack", size=50 * MB, priority=Priority.OPTIONAL),
+        File("https://a/small2", "small2", size=20),
+        File("https://a/client", "client", size=20 * MB, priority=Priority.LAUNCH),
+        File("https://a/big2", "big2", size=8 * MB),
+        File("https://a/small3", "small3", size=30),
+    ]
+
+    order = [file.dest for file in scheduler.plan(files)]
+
+    assert order == ["client", "big2", "small3", "big1", "small2", "small1", "pack"]
+
+def test_scheduler_host_limit():
+    files = [File(f"https://busy.example/{i}", str(i)) for i in range(10)]
+    files.append(File("https://idle.example/x", "x"))
+
+    plan = scheduler.Scheduler(files)
+    started = []
+    while (file := plan.next()) is not None:
+        started.append(file.dest)
+
+    assert len(started) == scheduler.host_limit("busy.example") + 1
+    assert "x" in started
+
+    plan.done(files[0])
+    assert plan.next() is not None
+
+def test_priority_for_pack_paths():
+    assert scheduler.priority_for("./mods/") == Priority.REQUIRED
+    assert scheduler.priority_for("./config/") == Priority.REQUIRED
+    assert scheduler.priority_for("./resourcepacks/") == Priority.OPTIONAL
+    assert scheduler.priority_for("shaderpacks") == Priority.OPTIONAL
+    assert scheduler.priority_for("./mods/", optional=True) == Priority.OPTIONAL
@@ -0,0 +1,28 @@
+import json
+from mod_manager import tracing
+
+def test_spans_nest_and_export():
+    assert tracing.span("off") is tracing.NULL_SPAN
+
+    tracing.reset()
+    tracing.enable()
+    try:
+        with tracing.span("install") as install:
+            with tracing.span("assets") as assets:
+                assets.add(2048, 2)
+            with tracing.span("assets"):
+                pass
+    finally:
+        tracing.disable()
+
+    assert [s.path for s in tracing.get_spans()] == [("install",), ("install", "assets"), ("install", "assets")]
+    assert install.seconds >= 0
+
+    lines = tracing.summary().splitlines()
+    assert lines[1].split()[:2] == ["install", "1"]
+    assert lines[2].split()[:2] == ["assets", "2"]
+
+    events = json.loads(json.dumps(tracing.to_chrome_trace()))["traceEvents"]
+    assert {event["name"] for event in events} == {"install", "assets"}
+    assert sum(event["args"]["files"] for event in events) == 2
+    tracing.reset()
@@ -0,0 +1,104 @@
+import os
+import hashlib
+import pytest
+from mod_manager import file_index
+from mod_manager.data_structures import File, UpdatePolicy
+from mod_manager.instances import updater
+
+def __write(path, content : bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return hashlib.sha1(content).hexdigest()
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    # apply_policy records what it hashed, that has to end up in tmp_path and not in META_PATH
+    monkeypatch.setattr(file_index, "INDEX_PATH", str(tmp_path / "verified_files.json"))
+    yield
+    # saved while INDEX_PATH still points at tmp_path, so nothing is left to write at exit
+    file_index.invalidate()
+    file_index.save()
+
+def test_update_keeps_modified_config(tmp_path, index_path):
+    directory = str(tmp_path)
+    mod = os.path.join(directory, "mods", "a.jar")
+    old_mod = os.path.join(directory, "mods", "old.jar")
+    config = os.path.join(directory, "config", "a.toml")
+    edited = os.path.join(directory, "config", "b.toml")
+
+    old_files = [
+        File("u", mod, __write(mod, b"mod v1")),
+        File("u", old_mod, __write(old_mod, b"old mod")),
+        File("u", config, __write(config, b"config v1")),
+        File("u", edited, hashlib.sha1(b"edited v1").hexdigest()),
+    ]
+    __write(edited, b"changed by the user")
+
+    new_files = [
+        File("u", mod, hashlib.sha1(b"mod v2").hexdigest()),
+        File("u", config, hashlib.sha1(b"config v2").hexdigest()),
+        File("u", edited, hashlib.sha1(b"edited v2").hexdigest()),
+        File("u", os.path.join(directory, "mods", "new.jar"), hashlib.sha1(b"new").hexdigest()),
+    ]
+
+    diff = updater.diff_files(old_files, new_files)
+    assert [f.dest for f in diff.removed] == [old_mod]
+    assert len(diff.changed) == 3 and len(diff.added) == 1
+
+    to_fetch, to_delete = updater.apply_policy(diff, old_files, directory, UpdatePolicy.KEEP_MODIFIED)
+    assert sorted(f.dest for f in to_fetch) == sorted([mod, config, os.path.join(directory, "mods", "new.jar")])
+    assert [f.dest for f in to_delete] == [old_mod]
+    assert [f.dest for f in diff.kept] == [edited]
+
+    to_fetch, _ = updater.apply_policy(updater.diff_files(old_files, new_files), old_files, directory, UpdatePolicy.OVERWRITE)
+    assert edited in [f.dest for f in to_fetch]
+
+def test_failed_update_keeps_old_version(tmp_path, monkeypatch, index_path):
+    from mod_manager.downloaders import ftb
+    from mod_manager.instances.instance import Instance
+
+    directory = os.path.join(str(tmp_path), "instance", "minecraft")
+    old_mod = os.path.join(directory, "mods", "old.jar")
+    manifests = {
+        "1": {"name": "1.0", "files": [{"name": "old.jar", "sha1": __write(old_mod, b"old")}]},
+        "2": {"name": "2.0", "files": [{"name": "new.jar", "sha1": hashlib.sha1(b"new").hexdigest()}]},
+    }
+    monkeypatch.setattr(ftb, "get_version_manifest", lambda mp_version: manifests[mp_version.version_id])
+    monkeypatch.setattr(ftb, "get_files", lambda manifest, d: [File("u", os.path.join(d, "mods", f["name"]), f["sha1"]) for f in manifest["files"]])
+    monkeypatch.setattr(ftb, "install_files", lambda files: files)
+
+    instance = Instance({"name": "Pack", "mc_version": {"mc": "1.20.1", "loader": "forge", "loader_version": "47.1.0"},
+                         "mp_version": {"name": "1.0", "mid": "100", "vid": "1"}, "platform": "ftb", "directory": os.path.dirname(directory)})
+    with pytest.raises(RuntimeError):
+        instance.update("2")
+    assert os.path.exists(old_mod)
+    assert instance.mp_version.version_id == "1"
+    assert not os.path.exists(os.path.join(os.path.dirname(directory), "instance.json"))
+
+def test_overrides_only_keep_changed_files(tmp_path):
+    import zipfile
+    from mod_manager.downloaders import curseforge
+
+    directory = str(tmp_path / "minecraft")
+    old_zip = str(tmp_path / "old.zip")
+    with zipfile.ZipFile(old_zip, "w") as zf:
+        zf.writestr("overrides/config/a.cfg", "a v1")
+        zf.writestr("overrides/config/b.cfg", "b v1")
+    os.makedirs(directory)
+    with zipfile.ZipFile(os.path.join(directory, "overrides.zip"), "w") as zf:
+        for name in ("a", "b", "c"):
+            zf.writestr(f"overrides/config/{name}.cfg", f"{name} v2")
+    __write(os.path.join(directory, "config", "a.cfg"), b"a v1")
+    __write(os.path.join(directory, "config", "b.cfg"), b"changed by the user")
+    __write(os.path.join(directory, "config", "c.cfg"), b"made by the game")
+
+    curseforge.extract_overrides({"files": [{"type": "cf-extract", "path": "", "name": "overrides.zip"}]}, directory, overwrite=False, previous=old_zip)
+
+    def read(name):
+        with open(os.path.join(directory, "config", name), "rb") as f:
+            return f.read()
+    assert read("a.cfg") == b"a v2"
+    assert read("b.cfg") == b"changed by the user"
+    assert read("c.cfg") == b"made by the game"
+    assert not os.path.exists(os.path.join(directory, "overrides.zip"))
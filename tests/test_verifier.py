@@ -0,0 +1,74 @@
+import os
+import hashlib
+import pytest
+from mod_manager import file_index
+from mod_manager.data_structures import File, UpdatePolicy
+from mod_manager.downloaders import ftb, vanilla
+from mod_manager.instances import verifier
+from mod_manager.instances.instance import Instance
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_index, "INDEX_PATH", str(tmp_path / "verified_files.json"))
+    yield
+    # saved while INDEX_PATH still points at tmp_path, so nothing is left to write at exit
+    file_index.invalidate()
+    file_index.save()
+
+def __write(path : str, content : bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return hashlib.sha1(content).hexdigest()
+
+def test_verify_files(tmp_path, index_path):
+    good = str(tmp_path / "good.jar")
+    corrupt = str(tmp_path / "corrupt.jar")
+    files = [
+        File("u", good, __write(good, b"good"), 4),
+        File("u", corrupt, hashlib.sha1(b"expected").hexdigest(), 8),
+        File("u", str(tmp_path / "missing.jar"), "0" * 40, 1),
+    ]
+    __write(corrupt, b"something else")
+
+    report = verifier.verify_files(files)
+    assert report.checked == 3 and report.checked_bytes == 4
+    assert [file.dest for file in report.corrupt] == [corrupt]
+    assert [file.dest for file in report.missing] == [str(tmp_path / "missing.jar")]
+    assert not report.ok
+
+def test_verify_keeps_changed_configs(tmp_path, monkeypatch, index_path):
+    directory = str(tmp_path / "instance" / "minecraft")
+    mod = os.path.join(directory, "mods", "a.jar")
+    config = os.path.join(directory, "config", "a.toml")
+    extra = os.path.join(directory, "mods", "extra.jar")
+    pack_files = [
+        File("u", mod, hashlib.sha1(b"mod").hexdigest(), 3),
+        File("u", config, hashlib.sha1(b"config").hexdigest(), 6),
+        File("u", os.path.join(directory, "mods", "missing.jar"), "0" * 40, 1),
+    ]
+    __write(mod, b"broken mod")
+    __write(config, b"changed by the user")
+    __write(extra, b"added by the user")
+
+    monkeypatch.setattr(ftb, "get_version_manifest", lambda mp_version: {"files": [{}, {}, {}]})
+    monkeypatch.setattr(ftb, "get_files", lambda manifest, d: pack_files)
+    monkeypatch.setattr(vanilla, "get_files", lambda version: [])
+    instance = Instance({"name": "Pack", "mc_version": {"mc": "1.20.1", "loader": "vanilla", "loader_version": ""},
+                         "mp_version": {"name": "1.0", "mid": "100", "vid": "1"}, "platform": "ftb", "directory": os.path.dirname(directory)})
+
+    report = verifier.verify(instance)
+    assert [file.dest for file in report.corrupt] == [mod]
+    assert [file.dest for file in report.modified] == [config]
+    assert [file.dest for file in report.missing] == [os.path.join(directory, "mods", "missing.jar")]
+    assert report.extra == [extra]
+
+    # repairing only touches the mods, the config stays the user's
+    fetched = []
+    monkeypatch.setattr(ftb, "install_files", lambda files: fetched.extend(files) or [])
+    verifier.verify(instance, repair=True)
+    assert sorted(file.dest for file in fetched) == sorted([mod, os.path.join(directory, "mods", "missing.jar")])
+
+    fetched.clear()
+    verifier.verify(instance, repair=True, policy=UpdatePolicy.OVERWRITE)
+    assert config in [file.dest for file in fetched]